@@ -0,0 +1,114 @@
+import logging
+
+from app.cache import LRUCache, CacheInfo
+from app.config import aggregate_cache_settings
+
+logger = logging.getLogger(__name__)
+
+
+# Yozuvlar javobning ETag'i bilan saqlanadi (app.versions: data_version + kurslar versiyasi + valyuta).
+# ETag mos kelmasa yozuv eskirgan hisoblanadi, shuning uchun invalidatsiya kechiksa yoki
+# o'tkazib yuborilsa ham eski natija qaytmaydi; invalidate() esa xotirani darhol bo'shatadi.
+
+
+class LocalAggregateCache:
+    """Worker ichidagi LRU: user_id -> {kalit: (etag, payload)}; har bir foydalanuvchida ko'pi bilan
+    entries_per_user kalit, oshsa eng eski yozilgani chiqariladi"""
+
+    def __init__(self, maxsize=aggregate_cache_settings.maxsize, ttl=aggregate_cache_settings.ttl,
+                 entries_per_user=aggregate_cache_settings.entries_per_user):
+        self.users = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.entries_per_user = entries_per_user
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id, key, etag):
+        entries = self.users.get(user_id)
+        entry = entries.get(key) if entries is not None else None
+        if entry is not None and entry[0] == etag:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    async def set(self, user_id, key, etag, payload):
+        entries = self.users.get(user_id)
+        if entries is None:
+            entries = {}
+            self.users.set(user_id, entries)
+        # dict yozilish tartibini saqlaydi: qayta yozilgan kalit oxiriga o'tadi
+        entries.pop(key, None)
+        entries[key] = (etag, payload)
+        if len(entries) > self.entries_per_user:
+            del entries[next(iter(entries))]
+
+    async def invalidate(self, user_id):
+        self.users.invalidate(user_id)
+
+    def clear(self):
+        self.users.clear()
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.users.maxsize, self.users.cache_info().currsize)
+
+
+class RedisAggregateCache:
+    """Worker'lar orasida umumiy: har bir foydalanuvchi uchun bitta hash, invalidatsiya - bitta DEL.
+
+    client - redis.asyncio.Redis (yoki testlarda hget/hset/expire/delete'li o'rinbosar);
+    Redis ishlamay qolsa so'rovlar cache'siz davom etadi.
+    """
+
+    def __init__(self, client, ttl=aggregate_cache_settings.ttl, errors=(ConnectionError,)):
+        self.client = client
+        self.ttl = ttl
+        self.errors = errors
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def user_key(user_id):
+        return f"aggregates:{user_id}"
+
+    async def get(self, user_id, key, etag):
+        try:
+            value = await self.client.hget(self.user_key(user_id), key)
+        except self.errors:
+            logger.warning("aggregate cache get failed", exc_info=True)
+            value = None
+        if value is not None:
+            stored_etag, _, payload = value.partition(b"\n")
+            if stored_etag == etag.encode():
+                self.hits += 1
+                return payload
+        self.misses += 1
+        return None
+
+    async def set(self, user_id, key, etag, payload):
+        name = self.user_key(user_id)
+        try:
+            await self.client.hset(name, key, etag.encode() + b"\n" + payload)
+            await self.client.expire(name, self.ttl)
+        except self.errors:
+            logger.warning("aggregate cache set failed", exc_info=True)
+
+    async def invalidate(self, user_id):
+        try:
+            await self.client.delete(self.user_key(user_id))
+        except self.errors:
+            logger.warning("aggregate cache invalidate failed", exc_info=True)
+
+    def cache_info(self):
+        # umumiy hajm Redis'da; bu yerda faqat shu worker'ning hit/miss'lari
+        return CacheInfo(self.hits, self.misses, None, None)
+
+
+def get_aggregate_cache(settings=aggregate_cache_settings):
+    if settings.backend == 'redis':
+        import redis.asyncio  # ixtiyoriy bog'liqlik, faqat redis backend uchun
+        return RedisAggregateCache(redis.asyncio.Redis.from_url(settings.redis_url), settings.ttl,
+                                   errors=(redis.RedisError,))
+    return LocalAggregateCache(settings.maxsize, settings.ttl, settings.entries_per_user)
+
+
+aggregate_cache = get_aggregate_cache()
@@ -0,0 +1,103 @@
+from sqlalchemy import select, func, case, delete
+
+from app.database import dialect_insert
+
+from app.models import Debt, DebtBalance
+
+BALANCE_KEY = (DebtBalance.user_id, DebtBalance.name_id, DebtBalance.currency)
+
+
+def choice_code(value):
+    """ChoiceType qiymati (Choice obyekt yoki hali flush qilinmagan satr) -> kod"""
+    return getattr(value, 'code', value)
+
+
+def add_balance_delta(deltas, name_id, currency, debt_type, amount, count=1):
+    """deltas'ga bitta qarzni qo'shadi (count=1) yoki ayiradi (count=-1, amount manfiy emas)"""
+    key = (name_id, choice_code(currency))
+    owed_to, owed_by, debt_count = deltas.get(key, (0, 0, 0))
+    if choice_code(debt_type) == 'OWED_TO':
+        owed_to += amount * count
+    else:
+        owed_by += amount * count
+    deltas[key] = (owed_to, owed_by, debt_count + count)
+
+
+async def apply_balances(session, user_id, deltas):
+    """deltas: {(name_id, currency): (owed_to, owed_by, debt_count)} -> bitta executemany upsert"""
+    if not deltas:
+        return
+    stmt = dialect_insert(session, DebtBalance.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[column.name for column in BALANCE_KEY],
+        set_={
+            "owed_to": DebtBalance.owed_to + stmt.excluded.owed_to,
+            "owed_by": DebtBalance.owed_by + stmt.excluded.owed_by,
+            "debt_count": DebtBalance.debt_count + stmt.excluded.debt_count,
+        }
+    )
+    await session.execute(stmt, [
+        {
+            "user_id": user_id,
+            "name_id": name_id,
+            "currency": currency,
+            "owed_to": owed_to,
+            "owed_by": owed_by,
+            "debt_count": debt_count
+        } for (name_id, currency), (owed_to, owed_by, debt_count) in deltas.items()
+    ])
+
+
+async def apply_balance(session, user_id, name_id, currency, debt_type, amount, count=1):
+    deltas = {}
+    add_balance_delta(deltas, name_id, currency, debt_type, amount, count)
+    await apply_balances(session, user_id, deltas)
+
+
+def expected_balances_query():
+    """Balans jadvalini Debt jadvalidan noldan hisoblaydigan so'rov"""
+    return (
+        select(
+            Debt.user_id,
+            Debt.name_id,
+            Debt.currency,
+            func.sum(case((Debt.debt_type == 'OWED_TO', Debt.amount), else_=0)).label("owed_to"),
+            func.sum(case((Debt.debt_type == 'OWED_BY', Debt.amount), else_=0)).label("owed_by"),
+            func.count(Debt.id).label("debt_count"),
+        )
+        .group_by(Debt.user_id, Debt.name_id, Debt.currency)
+    )
+
+
+async def balance_drift(session):
+    """Balans jadvali Debt jadvalidan farq qiladigan kalitlar: [(key, stored, expected), ...]; summalar butun, aniq taqqoslanadi"""
+    def by_key(rows):
+        return {
+            (row.user_id, row.name_id, choice_code(row.currency)): (row.owed_to, row.owed_by, row.debt_count)
+            for row in rows
+        }
+
+    expected = by_key((await session.execute(expected_balances_query())).all())
+    stored = by_key((await session.execute(
+        select(*BALANCE_KEY, DebtBalance.owed_to, DebtBalance.owed_by, DebtBalance.debt_count)
+        .where(DebtBalance.debt_count != 0)
+    )).all())
+
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        stored_value = stored.get(key, (0, 0, 0))
+        expected_value = expected.get(key, (0, 0, 0))
+        if stored_value != expected_value:
+            drift.append((key, stored_value, expected_value))
+    return drift
+
+
+async def rebuild_balances(session):
+    """Balans jadvalini Debt jadvalidan qayta quradi (chaqiruvchi commit qiladi)"""
+    await session.execute(delete(DebtBalance))
+    await session.execute(
+        dialect_insert(session, DebtBalance.__table__).from_select(
+            ["user_id", "name_id", "currency", "owed_to", "owed_by", "debt_count"],
+            expected_balances_query()
+        )
+    )
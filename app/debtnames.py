@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+from sqlalchemy import select, delete, exists
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.cache import LRUCache
+from app.database import dialect_insert
+from app.models import DebtName, Debt
+
+DEBT_NAME_CACHE_MAXSIZE = 10000
+# soniya; yetim DebtName qatorlari shu oraliqda tozalanadi
+DEBT_NAME_SWEEP_INTERVAL = 600
+
+logger = logging.getLogger(__name__)
+
+# name -> id; faqat commit qilingan qatorlar (SELECT natijasi) yoziladi, DebtName o'chirilganda tozalanadi
+debt_name_cache = LRUCache(maxsize=DEBT_NAME_CACHE_MAXSIZE)
+
+
+def invalidate_debt_names(names):
+    for name in names:
+        debt_name_cache.invalidate(name)
+
+
+async def select_debt_name_ids(session, names):
+    name_ids = dict((await session.execute(
+        select(DebtName.name, DebtName.id).where(DebtName.name.in_(names))
+    )).all())
+    for name, name_id in name_ids.items():
+        debt_name_cache.set(name, name_id)
+    return name_ids
+
+
+async def resolve_debt_name_ids(session, names):
+    """{name: id}: cache'dagi ismlar so'rovsiz, qolganlari bitta SELECT va bitta INSERT ... ON CONFLICT DO NOTHING RETURNING bilan"""
+    names = list(dict.fromkeys(names))  # takrorlarsiz, birinchi uchragan tartibda
+    name_ids = {}
+    for name in names:
+        name_id = debt_name_cache.get(name)
+        if name_id is not None:
+            name_ids[name] = name_id
+    missing = [name for name in names if name not in name_ids]
+    if missing:
+        name_ids.update(await select_debt_name_ids(session, missing))
+        missing = [name for name in missing if name not in name_ids]
+    if missing:
+        stmt = dialect_insert(session, DebtName.__table__).on_conflict_do_nothing(index_elements=[DebtName.name])
+        inserted = await session.execute(
+            stmt.returning(DebtName.name, DebtName.id),
+            [{"name": name} for name in missing]
+        )
+        # yangi qatorlar hali commit qilinmagan, shuning uchun cache'ga yozilmaydi
+        name_ids.update(inserted.all())
+        missing = [name for name in missing if name not in name_ids]
+    if missing:
+        # SELECT va INSERT orasida boshqa so'rov qo'shib ulgurgan ismlar
+        name_ids.update(await select_debt_name_ids(session, missing))
+    return name_ids
+
+
+async def sweep_orphan_debt_names(session):
+    """Hech bir qarz bog'lanmagan DebtName qatorlarini bitta set-based DELETE bilan o'chiradi, o'chirilgan ismlarni qaytaradi"""
+    result = await session.execute(
+        delete(DebtName)
+        .where(~exists().where(Debt.name_id == DebtName.id))
+        .returning(DebtName.name)
+    )
+    names = result.scalars().all()
+    await session.commit()
+    invalidate_debt_names(names)
+    return names
+
+
+async def sweep_orphan_debt_names_periodically(session_factory, interval=DEBT_NAME_SWEEP_INTERVAL):
+    """Lifespan davomida ishlaydigan fon vazifasi"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as session:
+                names = await sweep_orphan_debt_names(session)
+            if names:
+                logger.info("swept %d orphan debt names", len(names))
+        except SQLAlchemyError:
+            # masalan, shu payt yetim ismga yangi qarz yozilgan (FK); keyingi aylanishda qayta urinamiz
+            logger.exception("orphan debt name sweep failed")
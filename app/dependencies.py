@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from fastapi import Depends, status
+from fastapi.exceptions import HTTPException
+from fastapi_jwt_auth import AuthJWT
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import LRUCache
+from app.database import get_db
+from app.models import User, Setting
+
+USER_CACHE_MAXSIZE = 4096
+# is_active va setting o'zgarishi boshqa worker'larda shu muddatdan kechikmay ko'rinadi
+USER_CACHE_TTL = 60
+
+
+class CurrentUser(NamedTuple):
+    id: int
+    username: str
+    is_active: bool
+    setting_id: Optional[int]
+    currency: Optional[str]
+    reminder_time: Optional[int]
+    data_version: int = 1
+    data_modified_at: Optional[datetime] = None
+
+
+# username -> CurrentUser
+user_cache = LRUCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL)
+
+
+def invalidate_current_user(username):
+    user_cache.invalidate(username)
+
+
+async def get_current_user(Authorize: AuthJWT = Depends(), session: AsyncSession = Depends(get_db)) -> CurrentUser:
+    try:
+        Authorize.jwt_required()
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    username = Authorize.get_jwt_subject()
+    current_user = user_cache.get(username)
+    if current_user is not None:
+        return current_user
+
+    # user va uning setting'i bitta so'rovda
+    row = (await session.execute(
+        select(User.id, User.username, User.is_active, Setting.id, Setting.currency, Setting.reminder_time,
+               User.data_version, User.data_modified_at)
+        .outerjoin(Setting, Setting.user_id == User.id)
+        .where(User.username == username)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    user_id, username, is_active, setting_id, currency, reminder_time, data_version, data_modified_at = row
+    current_user = CurrentUser(
+        id=user_id,
+        username=username,
+        is_active=is_active,
+        setting_id=setting_id,
+        currency=currency.code if currency is not None else None,
+        reminder_time=reminder_time,
+        data_version=data_version,
+        data_modified_at=data_modified_at
+    )
+    user_cache.set(username, current_user)
+    return current_user
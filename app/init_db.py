@@ -1,3 +1,13 @@
-from app.models import User, Setting, DebtName, Debt
+import asyncio
+
+from app.models import User, Setting, DebtName, Debt, DebtBalance, ReminderState
 from app.database import Base, engine
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+
+
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+asyncio.run(init_db())
@@ -1,3 +1,6 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi_jwt_auth import AuthJWT
 from pydantic import BaseModel
@@ -5,8 +8,31 @@ from pydantic import BaseModel
 from app.routers.setting_routes import setting_router
 from app.routers.auth_routes import auth_router
 from app.routers.debt_routes import debt_router
+from app.routers.metrics_routes import metrics_router
+from app.database import SessionLocal, create_memory_schema, engine
+from app.debtnames import sweep_orphan_debt_names_periodically
+from app.config import reminder_settings
+from app.reminders import reminder_scheduler
+from app.metrics import MetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # DB_URL=sqlite+aiosqlite:///:memory: bo'lsa jadvallar shu jarayonning bazasida yaratiladi
+    await create_memory_schema(engine)
+    # yetim DebtName qatorlarini request yo'lidan tashqarida tozalash
+    tasks = [asyncio.create_task(sweep_orphan_debt_names_periodically(SessionLocal))]
+    if reminder_settings.enabled:
+        # qaytarish muddati kelgan qarzlar uchun eslatmalar
+        tasks.append(asyncio.create_task(reminder_scheduler.serve(SessionLocal)))
+    yield
+    for task in tasks:
+        task.cancel()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# har route uchun latency, status va so'rov boshiga SQL statement'lar soni: GET /metrics
+app.add_middleware(MetricsMiddleware)
 
 
 class Settings(BaseModel):
@@ -21,4 +47,5 @@ def get_config():
 app.include_router(setting_router)
 app.include_router(auth_router)
 app.include_router(debt_router)
+app.include_router(metrics_router)
 
@@ -0,0 +1,206 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# soniya
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        # label qiymatlari -> son
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # label qiymatlari -> [har bucket'ga tushganlar (+Inf bilan), yig'indi]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        counts_and_sum = self.values.get(labels)
+        if counts_and_sum is None:
+            counts_and_sum = self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+        # le: value <= chegara bo'lgan birinchi bucket
+        counts_and_sum[0][bisect_left(self.buckets, value)] += 1
+        counts_and_sum[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       format_labels(self.labelnames, labels, [('le', format_value(bound))]), cumulative)
+            yield f'{self.name}_sum', format_labels(self.labelnames, labels), total
+            yield f'{self.name}_count', format_labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # scrape paytida chaqiriladi (masalan, cache_info'ni gauge'larga yozish uchun)
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format"""
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    'http_requests_total', 'HTTP requests by route template and status code.', ('method', 'route', 'status')
+))
+http_request_duration_seconds = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency until the response body is sent.', ('method', 'route')
+))
+http_requests_in_flight = registry.register(Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served.'
+))
+db_queries_per_request = registry.register(Histogram(
+    'db_queries_per_request', 'SQL statements executed while serving one request.', ('method', 'route'),
+    buckets=QUERY_COUNT_BUCKETS
+))
+db_seconds_per_request = registry.register(Histogram(
+    'db_seconds_per_request', 'Time spent executing SQL statements while serving one request.', ('method', 'route')
+))
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# middleware har so'rov uchun yangisini o'rnatadi; fon vazifalari (sweep, eslatmalar) uchun None
+request_stats = ContextVar('request_stats', default=None)
+
+
+# Engine klassiga: ilovaning ham, testlarning ham barcha engine'lari (AsyncEngine.sync_engine) uchun
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started_at'].pop()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(exception_context):
+    # xato bo'lgan so'rov uchun after_cursor_execute chaqirilmaydi
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_started_at'):
+        conn.info['query_started_at'].pop()
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+
+
+class MetricsMiddleware:
+    """Toza ASGI middleware: streaming javoblar ham oxirgi chunk'gacha o'lchanadi"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            request_stats.reset(token)
+            # route shabloni (/api/debts/{id}/): label'lar soni endpointlar soniga teng bo'ladi
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            method = scope['method']
+            http_requests_total.inc(method, route, str(status_code))
+            http_request_duration_seconds.observe(elapsed, method, route)
+            db_queries_per_request.observe(stats.queries, method, route)
+            db_seconds_per_request.observe(stats.db_seconds, method, route)
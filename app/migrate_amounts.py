@@ -0,0 +1,54 @@
+"""Float summalarni minor birliklardagi butun sonlarga (BIGINT) o'tkazish.
+
+    python -m app.migrate_amounts
+
+debt.amount va debt_balance.owed_to/owed_by ustunlari double precision bo'lsa BIGINT'ga o'tkaziladi
+(qiymat * MINOR_UNITS, yaxlitlab), so'ng debt_balance Debt jadvalidan aniq qayta quriladi.
+Hammasi bitta tranzaksiyada; allaqachon o'tkazilgan bazada hech narsa qilmaydi.
+"""
+import asyncio
+
+from sqlalchemy import text
+
+from app.balances import rebuild_balances
+from app.database import SessionLocal, engine
+from app.money import MINOR_UNITS
+
+AMOUNT_COLUMNS = (
+    ("debt", "amount"),
+    ("debt_balance", "owed_to"),
+    ("debt_balance", "owed_by"),
+)
+
+
+async def migrate_amounts(session):
+    """O'tkazilgan ustunlar ro'yxatini qaytaradi (chaqiruvchi commit qiladi)"""
+    migrated = []
+    for table, column in AMOUNT_COLUMNS:
+        data_type = await session.scalar(
+            text("SELECT data_type FROM information_schema.columns "
+                 "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"),
+            {"table": table, "column": column}
+        )
+        if data_type in ("double precision", "real", "numeric"):
+            await session.execute(text(
+                f'ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT '
+                f'USING round({column}::numeric * {MINOR_UNITS})::bigint'
+            ))
+            migrated.append(f"{table}.{column}")
+    if migrated:
+        # eski float yig'indilarni emas, Debt jadvalidagi aniq summalarni olamiz
+        await rebuild_balances(session)
+    return migrated
+
+
+async def main():
+    async with SessionLocal() as session:
+        migrated = await migrate_amounts(session)
+        await session.commit()
+    await engine.dispose()
+    print(f"migrated: {', '.join(migrated)}" if migrated else "amounts are already stored in minor units")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
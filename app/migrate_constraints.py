@@ -0,0 +1,99 @@
+"""Unique cheklovlar va indekslarni mavjud bazaga qo'shish (create_all mavjud jadvallarga ularni qo'shmaydi).
+
+    python -m app.migrate_constraints
+
+- debtname.name: takroriy ismlar birlashtiriladi (debt.name_id eng kichik id'ga o'tkaziladi, debt_balance
+  qayta quriladi), so'ng unique indeks yaratiladi - resolve_debt_name_ids'dagi ON CONFLICT (name) shunga tayanadi;
+- setting.user_id: foydalanuvchining ortiqcha setting qatorlari (eng kichik id'dan boshqalari) o'chiriladi,
+  so'ng unique cheklov qo'shiladi;
+- debt jadvalining indekslari (Debt.__table_args__) CREATE INDEX IF NOT EXISTS bilan yaratiladi.
+
+Hammasi bitta tranzaksiyada; allaqachon o'tkazilgan bazada hech narsa qilmaydi.
+"""
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from app.balances import rebuild_balances
+from app.database import SessionLocal, engine
+from app.models import Debt, DebtName
+
+DEBTNAME_NAME_INDEX = next(index for index in DebtName.__table__.indexes if index.unique)
+SETTING_USER_ID_CONSTRAINT = "setting_user_id_key"
+
+
+async def index_is_unique(session, name):
+    """True/False, indeks bo'lmasa None"""
+    return await session.scalar(
+        text("SELECT indisunique FROM pg_index "
+             "WHERE indexrelid = to_regclass(quote_ident(current_schema()) || '.' || quote_ident(:name))"),
+        {"name": name}
+    )
+
+
+async def merge_duplicate_debt_names(session):
+    """Bir xil ismli DebtName qatorlarini eng kichik id'ga birlashtiradi, o'chirilgan qatorlar sonini qaytaradi"""
+    await session.execute(text(
+        "UPDATE debt SET name_id = duplicate.keep_id "
+        "FROM (SELECT id, min(id) OVER (PARTITION BY name) AS keep_id FROM debtname) AS duplicate "
+        "WHERE debt.name_id = duplicate.id AND duplicate.id <> duplicate.keep_id"
+    ))
+    # debt_balance qatorlari ham o'chiriladigan id'larga bog'langan (ondelete=CASCADE); keyin qayta quriladi
+    result = await session.execute(text(
+        "DELETE FROM debtname USING debtname AS keep "
+        "WHERE debtname.name = keep.name AND debtname.id > keep.id"
+    ))
+    return result.rowcount
+
+
+async def migrate_constraints(session):
+    """Bajarilgan qadamlar ro'yxatini qaytaradi (chaqiruvchi commit qiladi)"""
+    migrated = []
+
+    unique = await index_is_unique(session, DEBTNAME_NAME_INDEX.name)
+    if not unique:
+        if unique is False:
+            # user-006 dagi oddiy (unique bo'lmagan) indeks xuddi shu nom bilan
+            await session.execute(text(f"DROP INDEX {DEBTNAME_NAME_INDEX.name}"))
+        merged = await merge_duplicate_debt_names(session)
+        if merged:
+            # eski float yig'indilar emas, birlashtirilgan name_id'lar bo'yicha Debt jadvalidan
+            await rebuild_balances(session)
+            migrated.append(f"debtname: merged {merged} duplicate names")
+        await session.execute(CreateIndex(DEBTNAME_NAME_INDEX))
+        migrated.append(DEBTNAME_NAME_INDEX.name)
+
+    constraint_exists = await session.scalar(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name AND conrelid = 'setting'::regclass"),
+        {"name": SETTING_USER_ID_CONSTRAINT}
+    )
+    if not constraint_exists:
+        result = await session.execute(text(
+            "DELETE FROM setting USING setting AS keep "
+            "WHERE setting.user_id = keep.user_id AND setting.id > keep.id"
+        ))
+        if result.rowcount:
+            migrated.append(f"setting: removed {result.rowcount} duplicate rows")
+        await session.execute(text(
+            f"ALTER TABLE setting ADD CONSTRAINT {SETTING_USER_ID_CONSTRAINT} UNIQUE (user_id)"
+        ))
+        migrated.append(SETTING_USER_ID_CONSTRAINT)
+
+    for index in sorted(Debt.__table__.indexes, key=lambda index: index.name):
+        if await index_is_unique(session, index.name) is None:
+            await session.execute(CreateIndex(index))
+            migrated.append(index.name)
+    return migrated
+
+
+async def main():
+    async with SessionLocal() as session:
+        migrated = await migrate_constraints(session)
+        await session.commit()
+    await engine.dispose()
+    print(f"migrated: {', '.join(migrated)}" if migrated else "constraints and indexes are already present")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
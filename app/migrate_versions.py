@@ -0,0 +1,45 @@
+"""Versiya ustunlarini mavjud bazaga qo'shish (create_all mavjud jadvallarga yangi ustun qo'shmaydi).
+
+    python -m app.migrate_versions
+
+Ustunlar ADD COLUMN IF NOT EXISTS bilan qo'shiladi, mavjud qatorlar DEFAULT qiymatni oladi.
+Hammasi bitta tranzaksiyada; allaqachon qo'shilgan bazada hech narsa qilmaydi.
+"""
+import asyncio
+
+from sqlalchemy import text
+
+from app.database import SessionLocal, engine
+
+VERSION_COLUMNS = (
+    ("user", "data_version", "INTEGER NOT NULL DEFAULT 1"),
+    ("user", "data_modified_at", "TIMESTAMP WITH TIME ZONE DEFAULT now()"),
+    ("debt", "version", "INTEGER NOT NULL DEFAULT 1"),
+)
+
+
+async def migrate_versions(session):
+    """Qo'shilgan ustunlar ro'yxatini qaytaradi (chaqiruvchi commit qiladi)"""
+    migrated = []
+    for table, column, definition in VERSION_COLUMNS:
+        exists = await session.scalar(
+            text("SELECT 1 FROM information_schema.columns "
+                 "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"),
+            {"table": table, "column": column}
+        )
+        if not exists:
+            await session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS {column} {definition}'))
+            migrated.append(f"{table}.{column}")
+    return migrated
+
+
+async def main():
+    async with SessionLocal() as session:
+        migrated = await migrate_versions(session)
+        await session.commit()
+    await engine.dispose()
+    print(f"migrated: {', '.join(migrated)}" if migrated else "version columns are already present")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Boolean, Text, String, Float, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Boolean, Text, String, DateTime, func, ForeignKey, Index
 from sqlalchemy_utils import ChoiceType
 from sqlalchemy.orm import relationship
 
@@ -12,6 +12,9 @@ class User(Base):
     email = Column(String(70), unique=True)
     password = Column(Text, nullable=True)
     is_active = Column(Boolean, default=False)
+    # qarzlari yoki sozlamasi o'zgarganda oshiriladi: o'qish endpointlarining ETag/Last-Modified'i
+    data_version = Column(Integer, nullable=False, default=1, server_default='1')
+    data_modified_at = Column(DateTime(timezone=True), nullable=True, server_default=func.now())
 
     setting = relationship('Setting', back_populates='user', uselist=False,  cascade='all, delete-orphan') # One-to-One
     debts = relationship('Debt', back_populates='user',  cascade='all, delete-orphan') # One-to-Many
@@ -27,7 +30,7 @@ class Setting(Base):
     id = Column(Integer, primary_key=True)
     currency = Column(ChoiceType(choices=CURRENCY_TYPES), default="UZS")
     reminder_time = Column(Integer, default=1)
-    user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('user.id'), nullable=False, unique=True)
     user = relationship('User', back_populates='setting')  # One-to-One munosabat
 
 
@@ -35,7 +38,7 @@ class DebtName(Base):
     __tablename__ = 'debtname'
 
     id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True, index=True)
 
     # Bog'lanishlar
     debts = relationship('Debt', back_populates='debtname')  # One-to-Many munosabat
@@ -46,18 +49,54 @@ class Debt(Base):
         ("OWED_BY", "owed_by")
     )
     __tablename__ = 'debt'
+    __table_args__ = (
+        # ?debt_type=owed_to/owed_by ro'yxati (id bo'yicha keyset)
+        Index('ix_debt_user_id_debt_type_id', 'user_id', 'debt_type', 'id'),
+        # individual summary va /debts/individual/{id} ro'yxati
+        Index('ix_debt_user_id_name_id_id', 'user_id', 'name_id', 'id'),
+        # yetim DebtName sweep'i (NOT EXISTS) va DebtName o'chirilganda FK tekshiruvi
+        Index('ix_debt_name_id', 'name_id'),
+        # eslatma scheduler'i: return_time oralig'i bo'yicha so'rov
+        Index('ix_debt_return_time', 'return_time'),
+    )
     id = Column(Integer, primary_key=True)
     debt_type = Column(ChoiceType(choices=DEBT_STATUS), default='OWED_TO')
     name_id = Column(Integer, ForeignKey('debtname.id'), nullable=False)
-    amount = Column(Float, nullable=False)
+    # minor birliklarda (app.money.MINOR_UNITS): 130.50 USD -> 13050
+    amount = Column(BigInteger, nullable=False)
     currency = Column(ChoiceType(choices=Setting.CURRENCY_TYPES), default=Setting.currency)
     description = Column(Text, nullable=True)
     received_or_given_time = Column(DateTime, default=func.now(), nullable=True)
     return_time = Column(DateTime, nullable=True)
     setting_reminder_time_default = Column(Boolean, default=False, nullable=True)
     user_id = Column(Integer, ForeignKey('user.id'))  # ForeignKey to User
+    # har bir update'da oshadi; ETag/If-Match (optimistic concurrency) uchun
+    version = Column(Integer, nullable=False, default=1, server_default='1')
     # Bog'lanishlar
     debtname = relationship('DebtName', back_populates='debts')  # Many-to-One munosabat
 
     # User bilan munosabat
-    user = relationship('User', foreign_keys=[user_id], back_populates='debts', lazy='joined')
\ No newline at end of file
+    user = relationship('User', foreign_keys=[user_id], back_populates='debts', lazy='joined')
+
+
+class DebtBalance(Base):
+    """(user, counterparty, currency) bo'yicha qarz yig'indilari; Debt bilan bitta tranzaksiyada yangilanadi"""
+    __tablename__ = 'debt_balance'
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    name_id = Column(Integer, ForeignKey('debtname.id', ondelete='CASCADE'), primary_key=True)
+    currency = Column(ChoiceType(choices=Setting.CURRENCY_TYPES), primary_key=True)
+    # minor birliklarda, aniq butun son yig'indilari
+    owed_to = Column(BigInteger, nullable=False, default=0)
+    owed_by = Column(BigInteger, nullable=False, default=0)
+    # 0 bo'lsa foydalanuvchining bu ism va valyutada qarzi qolmagan
+    debt_count = Column(Integer, nullable=False, default=0)
+
+
+class ReminderState(Base):
+    """Eslatmalar qaysi paytgacha yuborilgan: barcha worker'lar uchun bitta qator (id=1).
+
+    Qator FOR UPDATE SKIP LOCKED bilan olinadi, shuning uchun bir nechta worker'dan bir payt faqat bittasi eslatma yuboradi.
+    """
+    __tablename__ = 'reminder_state'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    fired_until = Column(DateTime, nullable=False)
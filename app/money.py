@@ -0,0 +1,26 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# summalar bazada butun son ko'rinishida minor birliklarda (tiyin, sent) saqlanadi: 1 UZS/USD/EUR = 100
+MINOR_UNITS = 100
+# Debt.amount ustuni BIGINT
+MAX_MINOR_AMOUNT = 2 ** 63 - 1
+
+
+def to_minor(amount):
+    """API'dan kelgan summa -> minor birliklardagi butun son (yarmi yuqoriga yaxlitlanadi)"""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def fits_minor(amount):
+    """to_minor(amount) BIGINT ustuniga sig'adimi; NaN va Infinity sig'maydi"""
+    amount = Decimal(str(amount))
+    return amount.is_finite() and abs(amount) * MINOR_UNITS <= MAX_MINOR_AMOUNT
+
+
+def from_minor(value):
+    """Bazadagi (yoki SQL'da yig'ilgan) minor birliklar -> API javobidagi summa; yaxlitlash faqat shu yerda"""
+    if value is None:
+        return None
+    return int(Decimal(value).quantize(Decimal(1), rounding=ROUND_HALF_UP)) / MINOR_UNITS
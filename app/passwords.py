@@ -0,0 +1,49 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app.config import password_settings
+
+# hashlib (scrypt/pbkdf2) hisoblash paytida GIL'ni qo'yib yuboradi, shuning uchun threadlar yetarli
+executor = ThreadPoolExecutor(max_workers=password_settings.max_workers, thread_name_prefix='password-hash')
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+@lru_cache(maxsize=None)
+def hash_prefix(method):
+    """'scrypt' -> 'scrypt:32768:8:1': werkzeug to'ldiradigan default parametrlar bilan"""
+    return _hash('', method, 1).split('$', 1)[0]
+
+
+def needs_rehash(password_hash, method=None):
+    """Hash sozlamalardagidan boshqa algoritm yoki narx bilan saqlanganmi"""
+    method = method or password_settings.method
+    return password_hash.split('$', 1)[0] != hash_prefix(method)
+
+
+async def run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def hash_password(password):
+    return await run_in_executor(_hash, password, password_settings.method, password_settings.salt_length)
+
+
+def _verify_and_rehash(password_hash, password, method, salt_length):
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash, method):
+        return True, _hash(password, method, salt_length)
+    return True, None
+
+
+async def verify_password(password_hash, password):
+    """(to'g'rimi, yangi hash yoki None): eskirgan parametrlar bilan saqlangan hash qayta hisoblanadi"""
+    return await run_in_executor(
+        _verify_and_rehash, password_hash, password, password_settings.method, password_settings.salt_length
+    )
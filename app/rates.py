@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Dict, NamedTuple
+
+import httpx
+import orjson
+from sqlalchemy import case
+
+from app.config import rate_settings
+from app.models import Setting
+
+logger = logging.getLogger(__name__)
+
+
+class RatesTable(NamedTuple):
+    version: str
+    base: str
+    # valyuta -> 1 birligining `base` dagi qiymati
+    rates: Dict[str, float]
+
+    def factor(self, currency, target):
+        """1 `currency` necha `target` turadi"""
+        return self.rates[currency] / self.rates[target]
+
+    def converted(self, amount, currency_column, target):
+        """SQL ifoda: `amount` ustuni `target` valyutasida (agregat so'rov ichida, qatorma-qator Python'siz)"""
+        return amount * case(
+            {code: self.factor(code, target) for code in self.rates},
+            value=currency_column
+        )
+
+
+def parse_rates(content):
+    data = orjson.loads(content)
+    rates = {code: float(rate) for code, rate in data["rates"].items()}
+    missing = set(dict(Setting.CURRENCY_TYPES)) - set(rates)
+    if missing:
+        raise ValueError(f"rates for {', '.join(sorted(missing))} are missing")
+    if any(rate <= 0 for rate in rates.values()):
+        raise ValueError("rates must be positive")
+    # versiya berilmasa mazmundan hisoblanadi: kurslar o'zgarsa versiya ham o'zgaradi
+    version = str(data.get("version") or hashlib.sha1(content).hexdigest()[:12])
+    return RatesTable(version, data.get("base", "UZS"), rates)
+
+
+async def fetch_rates(source):
+    if source.startswith(("http://", "https://")):
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(source)
+            response.raise_for_status()
+            return parse_rates(response.content)
+
+    def read():
+        with open(source, 'rb') as file:
+            return file.read()
+    return parse_rates(await asyncio.to_thread(read))
+
+
+class RatesCache:
+    """Xotiradagi kurslar jadvali; `ttl` o'tgach manbadan qayta o'qiladi, o'qib bo'lmasa oldingi jadval qoladi"""
+
+    def __init__(self, source=rate_settings.source, ttl=rate_settings.ttl):
+        self.source = source
+        self.ttl = ttl
+        self.table = None
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def is_fresh(self):
+        return self.table is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    async def get(self):
+        if self.is_fresh():
+            return self.table
+        async with self._lock:
+            if not self.is_fresh():
+                await self.reload()
+        return self.table
+
+    async def reload(self):
+        try:
+            table = await fetch_rates(self.source)
+        except (OSError, ValueError, KeyError, httpx.HTTPError):
+            if self.table is None:
+                raise
+            # eski jadval bilan davom etamiz, keyingi ttl'da yana urinamiz
+            logger.exception("failed to reload rates from %s, keeping version %s", self.source, self.table.version)
+            self.loaded_at = time.monotonic()
+            return
+        if self.table is None or table.version != self.table.version:
+            logger.info("loaded rates version %s from %s", table.version, self.source)
+        self.table = table
+        self.loaded_at = time.monotonic()
+
+    def set(self, table):
+        self.table = table
+        self.loaded_at = time.monotonic()
+
+
+rates_cache = RatesCache()
@@ -0,0 +1,33 @@
+"""debt_balance jadvalini tekshirish va qayta qurish.
+
+    python -m app.rebuild_balances --check   # faqat farqlarni ko'rsatadi
+    python -m app.rebuild_balances           # jadvalni Debt jadvalidan qayta quradi
+"""
+import argparse
+import asyncio
+import sys
+
+from app.balances import balance_drift, rebuild_balances
+from app.database import SessionLocal, engine
+
+
+async def main(check):
+    async with SessionLocal() as session:
+        drift = await balance_drift(session)
+        for key, stored, expected in drift:
+            print(f"drift {key}: stored={stored} expected={expected}")
+        print(f"{len(drift)} drifted balance rows")
+
+        if not check:
+            await rebuild_balances(session)
+            await session.commit()
+            print("debt_balance rebuilt")
+    await engine.dispose()
+    return 1 if check and drift else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check or rebuild the debt_balance table")
+    parser.add_argument('--check', action='store_true', help="only report drift, exit 1 if any")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import orjson
+from sqlalchemy import select, update
+
+from app.config import reminder_settings
+from app.database import dialect_insert
+from app.models import Debt, DebtName, ReminderState
+from app.money import from_minor
+
+# soniya; so'rov yoki notifier xatosidan keyin qayta urinish
+REMINDER_RETRY_DELAY = 5
+# reminder_state jadvalidagi yagona qator
+REMINDER_STATE_ID = 1
+
+logger = logging.getLogger(__name__)
+
+
+class Reminder(NamedTuple):
+    debt_id: int
+    user_id: int
+    name: str
+    debt_type: str
+    amount: float
+    currency: str
+    return_time: datetime
+
+
+class LoggingNotifier:
+    async def __call__(self, reminders):
+        for reminder in reminders:
+            logger.info("debt %s (%s %s %s) is due at %s for user %s", reminder.debt_id, reminder.debt_type,
+                        reminder.amount, reminder.currency, reminder.return_time, reminder.user_id)
+
+
+class FileNotifier:
+    """Har bir eslatma faylga bitta NDJSON qatori bo'lib qo'shiladi"""
+
+    def __init__(self, path):
+        self.path = path
+
+    async def __call__(self, reminders):
+        lines = b''.join(orjson.dumps(reminder._asdict()) + b'\n' for reminder in reminders)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines):
+        with open(self.path, 'ab') as file:
+            file.write(lines)
+
+
+def get_notifier(settings=reminder_settings):
+    if settings.notifier == 'file':
+        return FileNotifier(settings.file_path)
+    return LoggingNotifier()
+
+
+def reminder_query(start, end):
+    """start < return_time <= end bo'lgan qarzlar (ix_debt_return_time bo'yicha range scan)"""
+    return (
+        select(Debt.id, Debt.user_id, DebtName.name, Debt.debt_type, Debt.amount, Debt.currency, Debt.return_time)
+        .join(DebtName, DebtName.id == Debt.name_id)
+        .where(Debt.return_time > start, Debt.return_time <= end)
+    )
+
+
+def reminder_from_row(row):
+    return Reminder(row.id, row.user_id, row.name, getattr(row.debt_type, 'code', row.debt_type), from_minor(row.amount),
+                    getattr(row.currency, 'code', row.currency), row.return_time)
+
+
+class ReminderScheduler:
+    """Eslatma scheduler'i: har bir worker'da ishlaydi, lekin eslatmalar bazadan va bir marta yuboriladi.
+
+    Uyg'onganda reminder_state qatori FOR UPDATE SKIP LOCKED bilan olinadi va (fired_until, now] oralig'idagi qarzlar
+    bitta range so'rov bilan o'qiladi: boshqa worker'da yaratilgan, o'zgartirilgan yoki o'chirilgan qarzlar ham
+    to'g'ri hisobga olinadi, qator band bo'lsa (boshqa worker yuboryapti) bu aylanish o'tkazib yuboriladi.
+    Heap faqat qachon uyg'onishni biladi: keyingi `horizon` ichidagi muddatlar va shu worker'dagi yozuvlar;
+    boshqa worker'lardagi yozuvlar ko'pi bilan `poll_interval` kechikish bilan topiladi.
+    """
+
+    def __init__(self, notifier=None, horizon=timedelta(seconds=reminder_settings.horizon),
+                 batch_size=reminder_settings.batch_size, poll_interval=timedelta(seconds=reminder_settings.poll_interval)):
+        self.notifier = notifier or get_notifier()
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        # yuklangan oynadagi muddatlar (return_time), faqat uyg'onish vaqti uchun
+        self.heap = []
+        self.loaded_until = None
+        self.state_created = False
+        self._wakeup = None
+
+    @property
+    def running(self):
+        return self.loaded_until is not None
+
+    def wake(self, return_time):
+        """Qarz yaratilgan yoki o'zgartirilgandan keyin (commit'dan so'ng): muddat yuklangan oynada bo'lsa
+        scheduler o'sha paytda uyg'onadi; oynadan tashqaridagisini keyingi yuklash topadi"""
+        if not self.in_window(return_time):
+            return
+        heapq.heappush(self.heap, return_time)
+        self._wakeup.set()
+
+    def in_window(self, return_time):
+        if not self.running or return_time is None:
+            return False
+        return datetime.now() < return_time <= self.loaded_until
+
+    async def load(self, session_factory, until):
+        async with session_factory() as session:
+            return_times = (await session.execute(
+                select(Debt.return_time).where(Debt.return_time > self.loaded_until, Debt.return_time <= until)
+            )).scalars().all()
+        for return_time in return_times:
+            heapq.heappush(self.heap, return_time)
+        self.loaded_until = until
+
+    async def fire(self, session_factory, now):
+        """(fired_until, now] dagi eslatmalarni yuboradi; fired_until commit qilingandan keyin yuboriladi
+        (notifier xatosida eslatma takrorlanmaydi, xuddi oldingi heap'dan olingandek)"""
+        async with session_factory() as session:
+            if not self.state_created:
+                # birinchi ishga tushishda: shu paytgacha bo'lgan muddatlar yuborilmaydi
+                await session.execute(
+                    dialect_insert(session, ReminderState.__table__)
+                    .values(id=REMINDER_STATE_ID, fired_until=now)
+                    .on_conflict_do_nothing(index_elements=[ReminderState.id])
+                )
+                self.state_created = True
+            fired_until = await session.scalar(
+                select(ReminderState.fired_until).where(ReminderState.id == REMINDER_STATE_ID)
+                .with_for_update(skip_locked=True)
+            )
+            if fired_until is None or fired_until >= now:
+                # boshqa worker hozir yuboryapti yoki bu oraliqni allaqachon yuborgan (yoki qator hozir yaratildi)
+                await session.commit()
+                return
+            rows = (await session.execute(reminder_query(fired_until, now).order_by(Debt.return_time, Debt.id))).all()
+            await session.execute(
+                update(ReminderState).where(ReminderState.id == REMINDER_STATE_ID).values(fired_until=now)
+            )
+            await session.commit()
+        due = [reminder_from_row(row) for row in rows]
+        for start in range(0, len(due), self.batch_size):
+            await self.notifier(due[start:start + self.batch_size])
+
+    async def run(self, session_factory):
+        self._wakeup = asyncio.Event()
+        self.loaded_until = datetime.now()
+        while True:
+            now = datetime.now()
+            try:
+                # oynaning yarmi qolganda keyingi oraliqni yuklaymiz
+                if self.loaded_until - now < self.horizon / 2:
+                    await self.load(session_factory, now + self.horizon)
+                while self.heap and self.heap[0] <= now:
+                    heapq.heappop(self.heap)
+                await self.fire(session_factory, now)
+            except Exception:
+                logger.exception("reminder scheduler iteration failed")
+                await asyncio.sleep(REMINDER_RETRY_DELAY)
+                continue
+
+            next_time = min(self.loaded_until - self.horizon / 2, now + self.poll_interval)
+            if self.heap:
+                next_time = min(next_time, self.heap[0])
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max((next_time - datetime.now()).total_seconds(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self.loaded_until = None
+        self.heap.clear()
+
+    async def serve(self, session_factory):
+        """Lifespan vazifasi: bekor qilinganda heap tozalanadi va hook'lar yana no-op bo'ladi"""
+        try:
+            await self.run(session_factory)
+        finally:
+            self.stop()
+
+
+reminder_scheduler = ReminderScheduler()
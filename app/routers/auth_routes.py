@@ -2,44 +2,68 @@ import datetime
 
 from fastapi import APIRouter, status, Depends
 from fastapi.exceptions import HTTPException
-from sqlalchemy import or_
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas import SignUpModel, Login
 from app.models import User, Setting
 from app.database import get_db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.balances import choice_code
+from app.dependencies import invalidate_current_user
+from app.passwords import hash_password, verify_password
 from fastapi_jwt_auth import AuthJWT
 
 auth_router = APIRouter(
     prefix='/auth'
 )
 
+# unique constraint nomi -> signup xabari
+UNIQUE_VIOLATION_DETAILS = {
+    "user_email_key": "User with this email already exists",
+    "user_username_key": "User with this username already exists",
+}
+# SQLite xabarida constraint nomi yo'q, faqat ustunlar: "UNIQUE constraint failed: user.email"
+SQLITE_UNIQUE_PREFIX = "UNIQUE constraint failed: "
+SQLITE_UNIQUE_CONSTRAINTS = {
+    "user.email": "user_email_key",
+    "user.username": "user_username_key",
+}
 
-@auth_router.post('/signup', status_code=status.HTTP_201_CREATED)
-async def signup(user: SignUpModel, session: Session = Depends(get_db)):
-    db_email = session.query(User).filter(user.email == User.email).first()
-    if db_email is not None:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email already exists")
-    db_username = session.query(User).filter(user.username == User.username).first()
-    if db_username is not None:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this username already exists")
 
+def violated_constraint(session, error):
+    """Buzilgan unique constraint nomi yoki None; xabar matnidagi DETAIL qiymatlariga qaralmaydi"""
+    if session.bind.dialect.name == 'sqlite':
+        message = str(error.orig)
+        if message.startswith(SQLITE_UNIQUE_PREFIX):
+            return SQLITE_UNIQUE_CONSTRAINTS.get(message[len(SQLITE_UNIQUE_PREFIX):])
+        return None
+    # asyncpg xatosi SQLAlchemy adapter xatosining __cause__'ida
+    return getattr(error.orig.__cause__, 'constraint_name', None)
+
+
+@auth_router.post('/signup', status_code=status.HTTP_201_CREATED)
+async def signup(user: SignUpModel, session: AsyncSession = Depends(get_db)):
     new_user = User(
         username=user.username,
         email=user.email,
-        password=generate_password_hash(user.password),
+        password=await hash_password(user.password),
         is_active=user.is_active
     )
+    # user va uning default sozlamasi bitta flush/commit'da; takrorlanishni unique constraint'lar tekshiradi
+    new_user_setting = Setting()
+    new_user.setting = new_user_setting
     session.add(new_user)
-    session.commit()
-
-    new_user_setting = Setting(
-        user_id=new_user.id
-    )
-    session.add(new_user_setting)
-    session.commit()
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        detail = UNIQUE_VIOLATION_DETAILS.get(violated_constraint(session, e))
+        if detail is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+        raise
+    invalidate_current_user(new_user.username)
 
     data = {
         "id": new_user.id,
@@ -47,9 +71,9 @@ async def signup(user: SignUpModel, session: Session = Depends(get_db)):
         "email": new_user.email,
         "is_active": new_user.is_active,
         "user_setting": {
-            "id": new_user.setting.id,
-            "currency": new_user.setting.currency.code,
-            "reminder_time": new_user.setting.reminder_time
+            "id": new_user_setting.id,
+            "currency": choice_code(new_user_setting.currency),
+            "reminder_time": new_user_setting.reminder_time
         }
     }
     response_data = {
@@ -62,13 +86,21 @@ async def signup(user: SignUpModel, session: Session = Depends(get_db)):
 
 
 @auth_router.post('/login', status_code=status.HTTP_200_OK)
-async def login(user: Login, Authorize: AuthJWT = Depends(), session: Session = Depends(get_db)):
-    db_user = session.query(User).filter(
+async def login(user: Login, Authorize: AuthJWT = Depends(), session: AsyncSession = Depends(get_db)):
+    db_user = await session.scalar(select(User).where(
         or_(User.username == user.username_or_email,
             User.email == user.username_or_email
             )
-    ).first()
-    if db_user and check_password_hash(db_user.password, user.password):
+    ))
+    if db_user is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid username or password")
+    is_valid, new_password_hash = await verify_password(db_user.password, user.password)
+    if is_valid:
+        if new_password_hash is not None:
+            # hash eski algoritm/narx bilan saqlangan: joriy sozlamalar bilan qayta saqlaymiz
+            db_user.password = new_password_hash
+            await session.commit()
+
         access_lifetime = datetime.timedelta(minutes=60)
         refresh_lifetime = datetime.timedelta(days=3)
         access_token = Authorize.create_access_token(subject=db_user.username, expires_time=access_lifetime)
@@ -1,152 +1,419 @@
+import csv
+import io
+import json
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Union, List
 
-from fastapi import APIRouter, status, Depends, Query
+import orjson
+from fastapi import APIRouter, status, Depends, Query, Request, Header
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import HTTPException
-from sqlalchemy.orm import Session
-
-from app.models import User, DebtName, Debt, Setting
-from app.schemas import DebtModel, DebtUpdateModel
-from fastapi_jwt_auth import AuthJWT
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select, func, insert, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.aggregates import aggregate_cache
+from app.balances import add_balance_delta, apply_balance, apply_balances, choice_code
+from app.models import DebtName, Debt, DebtBalance
+from app.schemas import (
+    DebtModel, DebtUpdateModel, DebtResponse, DebtUpdateResponse, DebtPage, IndividualDebtSummary
+)
+from app.serializers import (
+    DEBT_COLUMNS, DebtJSONResponse, debt_dict, debt_page_bytes, debt_items_chunk
+)
 from app.database import get_db
+from app.debtnames import resolve_debt_name_ids, invalidate_debt_names
+from app.dependencies import CurrentUser, get_current_user
+from app.reminders import reminder_scheduler
+from app.rates import rates_cache
+from app.money import to_minor, from_minor
+from app.versions import (
+    bump_data_version, check_data_version, check_converted_data_version, is_not_modified, not_modified
+)
 
 debt_router = APIRouter(
     prefix="/api"
 )
 
+DEBT_PAGE_SIZE = 50
+DEBT_PAGE_SIZE_MAX = 500
+# stream=true javobida bir chunk'da nechta qarz yuboriladi (server-side cursor yield_per)
+DEBT_STREAM_CHUNK_SIZE = 500
+# /debts/export ustunlari (CSV sarlavhasi va NDJSON kalitlari shu tartibda)
+EXPORT_COLUMNS = (
+    Debt.id, Debt.debt_type, DebtName.name, Debt.amount, Debt.currency, Debt.description,
+    Debt.received_or_given_time, Debt.return_time, Debt.setting_reminder_time_default
+)
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+# /debts/bulk: bitta INSERT (executemany) va balans upsert'iga nechta qarz tushadi
+BULK_BATCH_SIZE = 5000
+
+
+def debt_page_query(after, *where):
+    """Keyset pagination: Debt.id bo'yicha tartiblab, `after` dan keyingi qarzlar (DEBT_COLUMNS qatorlari)"""
+    query = select(*DEBT_COLUMNS).join(DebtName, DebtName.id == Debt.name_id).where(*where).order_by(Debt.id)
+    if after is not None:
+        query = query.where(Debt.id > after)
+    return query
 
-@debt_router.post('/debts/create', status_code=status.HTTP_201_CREATED)
-async def create_debt(debt_data: DebtModel, Authorize: AuthJWT=Depends(), session: Session = Depends(get_db)):
+
+async def fetch_debt_page(session, query, limit):
+    rows = (await session.execute(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+
+async def stream_debt_page(session, query, user):
+    # get_db sessiyasi javob yuborilishidan oldin yopiladi: generator uni qayta ishlatadi va oxirida o'zi yopadi
     try:
-        Authorize.jwt_required()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        yield b'{"data":['
+        separator = b''
+        result = await session.stream(query.execution_options(yield_per=DEBT_STREAM_CHUNK_SIZE))
+        async for rows in result.partitions():
+            yield separator + debt_items_chunk(user, rows)
+            separator = b','
+        yield b'],"next_cursor":null}'
+    finally:
+        await session.close()
+
+
+def export_record(row):
+    return {
+        "id": row.id,
+        "debt_type": row.debt_type.code,
+        "name": row.name,
+        "amount": from_minor(row.amount),
+        "currency": row.currency.code,
+        "description": row.description,
+        "received_or_given_time": row.received_or_given_time.isoformat() if row.received_or_given_time else None,
+        "return_time": row.return_time.isoformat() if row.return_time else None,
+        "setting_reminder_time_default": row.setting_reminder_time_default
+    }
 
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
-    setting = session.query(Setting).filter(current_user.id == Setting.user_id).first()
-    if not current_user.is_active:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not active")
 
-    current_debtname = session.query(DebtName).filter(debt_data.name == DebtName.name).first()
+async def stream_export(session, query, export_format):
+    # server-side cursor: xotirada bir vaqtda faqat bitta partition (DEBT_STREAM_CHUNK_SIZE qator) turadi
+    try:
+        fieldnames = [column.key for column in EXPORT_COLUMNS]
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+            writer.writeheader()
+            yield buffer.getvalue()
+        result = await session.stream(query.execution_options(yield_per=DEBT_STREAM_CHUNK_SIZE))
+        async for rows in result.partitions():
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+                writer.writerows(export_record(row) for row in rows)
+                yield buffer.getvalue()
+            else:
+                yield "".join(json.dumps(export_record(row)) + "\n" for row in rows)
+    finally:
+        await session.close()
 
-    if current_debtname is not None:
-        name_id = current_debtname.id
-    else:
-        new_debtname = DebtName(
-            name=str(debt_data.name)
 
-        )
-        session.add(new_debtname)
-        session.commit()
-        name_id = new_debtname.id
+def debt_etag(version):
+    return f'"{version}"'
+
+
+def parse_if_match(if_match):
+    """If-Match sarlavhasidan kutilgan versiya; '*' yoki sarlavha bo'lmasa None"""
+    if if_match is None or if_match.strip() == '*':
+        return None
+    value = if_match.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        # hech bir versiyaga mos kelmaydi
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Debt has been modified")
+
+
+@debt_router.post('/debts/create', status_code=status.HTTP_201_CREATED, response_model=DebtResponse)
+async def create_debt(debt_data: DebtModel, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    if not current_user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not active")
 
     if debt_data.return_time is not None:
         return_time = debt_data.return_time
     else:
         if debt_data.setting_reminder_time_default:
             current_time = datetime.now()
-            delta = timedelta(days=setting.reminder_time)
+            delta = timedelta(days=current_user.reminder_time)
             return_time = current_time + delta
         else:
             return_time = None
 
-    new_debt = Debt(
-        user_id=current_user.id,
-        debt_type=debt_data.debt_type,
-        name_id=name_id,
-        amount=float(debt_data.amount),
-        currency=debt_data.currency,
-        description=debt_data.description,
-        return_time=return_time,
-        setting_reminder_time_default=debt_data.setting_reminder_time_default
-    )
-    session.add(new_debt)
-    session.commit()
-    data = {
-        "id": new_debt.user.id,
-        "username": new_debt.user.username,
-        "debt": {
-            "id": new_debt.id,
-            "debt_type": new_debt.debt_type.code,
-            "name": new_debt.debtname.name,
-            "amount": new_debt.amount,
-            "currency": new_debt.currency.code,
-            "description": new_debt.description,
-            "received_or_given_time": new_debt.received_or_given_time,
-            "return_time": new_debt.return_time
+    async def write():
+        # ism cache'da bo'lsa so'rovsiz, aks holda upsert; qarz va balans bilan bitta tranzaksiyada
+        name_id = (await resolve_debt_name_ids(session, [debt_data.name]))[debt_data.name]
+        new_debt = Debt(
+            user_id=current_user.id,
+            debt_type=debt_data.debt_type or 'OWED_TO',
+            name_id=name_id,
+            amount=to_minor(debt_data.amount),
+            currency=debt_data.currency or current_user.currency,
+            description=debt_data.description,
+            return_time=return_time,
+            setting_reminder_time_default=debt_data.setting_reminder_time_default
+        )
+        session.add(new_debt)
+        await apply_balance(session, current_user.id, name_id, new_debt.currency, new_debt.debt_type, new_debt.amount)
+        await bump_data_version(session, current_user.id)
+        await session.commit()
+        return new_debt
+
+    new_debt = await retry_stale_debt_names([debt_data.name], write, session.rollback)
+    await aggregate_cache.invalidate(current_user.id)
+    await session.refresh(new_debt)
+    reminder_scheduler.wake(new_debt.return_time)
+    response_data = {
+        "success": True,
+        "code": 201,
+        "message": "Debt is create successfully",
+        "data": {
+            "id": current_user.id,
+            "username": current_user.username,
+            "debt": debt_dict(new_debt, name=debt_data.name)
         }
     }
+    return DebtJSONResponse(response_data, status_code=status.HTTP_201_CREATED,
+                            headers={"ETag": debt_etag(new_debt.version)})
+
+
+async def retry_stale_debt_names(names, write, rollback):
+    """write() ismlarni resolve qilib yozadi. Cache'dagi DebtName id shu orada boshqa worker'da sweep qilingan
+    bo'lsa (FK xatosi): rollback(), ismlar cache'dan tozalanadi va write() bir marta qayta chaqiriladi;
+    ikkinchi urinish ham o'xshamasa 409"""
+    for _ in range(2):
+        try:
+            return await write()
+        except IntegrityError:
+            await rollback()
+            invalidate_debt_names(list(names))
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Debt name was removed concurrently, please retry")
+
+
+async def bulk_records(request):
+    """(index, record): JSON massiv yoki NDJSON (application/x-ndjson) stream'dan qatorma-qator"""
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        index = 0
+        buffer = b''
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+    else:
+        try:
+            records = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array of debts")
+        for index, record in enumerate(records):
+            yield index, record
+
+
+async def insert_debt_rows(session, rows):
+    connection = await session.connection()
+    if connection.dialect.driver == 'asyncpg':
+        # COPY joriy tranzaksiya ulanishida: executemany'dan bir necha barobar tez
+        raw_connection = await connection.get_raw_connection()
+        columns = list(rows[0])
+        try:
+            await raw_connection.driver_connection.copy_records_to_table(
+                Debt.__tablename__,
+                records=[tuple(row[column] for column in columns) for row in rows],
+                columns=columns
+            )
+        except Exception as e:
+            # COPY driver'ga to'g'ridan-to'g'ri boradi: constraint xatolarini (SQLSTATE 23xxx) SQLAlchemy xatosiga o'giramiz
+            if getattr(e, 'sqlstate', '').startswith('23'):
+                raise IntegrityError(f'COPY {Debt.__tablename__}', None, e) from e
+            raise
+    else:
+        await session.execute(insert(Debt.__table__), rows)
+
+
+async def insert_debt_batch(session, current_user, batch, name_ids, deltas):
+    """Bitta batch qarzni yozadi; `name_ids` so'rov davomida to'ldirib boriladi, balans o'zgarishlari `deltas` ga yig'iladi.
+
+    Eslatma scheduler'ining joriy oynasiga tushgan muddatlarni qaytaradi.
+    """
+    unknown_names = list(dict.fromkeys(debt_data.name for debt_data in batch if debt_data.name not in name_ids))
+
+    async def write():
+        # batch SAVEPOINT ichida: FK xatosida oldingi batch'lar saqlanib, faqat shu batch qayta yoziladi
+        async with session.begin_nested():
+            name_ids.update(await resolve_debt_name_ids(session, unknown_names))
+            rows = debt_batch_rows(current_user, batch, name_ids)
+            await insert_debt_rows(session, rows)
+        return rows
+
+    async def rollback():
+        for name in unknown_names:
+            name_ids.pop(name, None)
+
+    rows = await retry_stale_debt_names(unknown_names, write, rollback)
+    for row in rows:
+        add_balance_delta(deltas, row["name_id"], row["currency"], row["debt_type"], row["amount"])
+    return [row["return_time"] for row in rows if reminder_scheduler.in_window(row["return_time"])]
+
+
+def debt_batch_rows(current_user, batch, name_ids):
+    now = datetime.now()
+    rows = []
+    for debt_data in batch:
+        return_time = debt_data.return_time
+        if return_time is None and debt_data.setting_reminder_time_default:
+            return_time = now + timedelta(days=current_user.reminder_time)
+        row = {
+            "user_id": current_user.id,
+            "debt_type": debt_data.debt_type or 'OWED_TO',
+            "name_id": name_ids[debt_data.name],
+            "amount": to_minor(debt_data.amount),
+            "currency": debt_data.currency or current_user.currency,
+            "description": debt_data.description,
+            "received_or_given_time": debt_data.received_or_given_time or now,
+            "return_time": return_time,
+            "setting_reminder_time_default": debt_data.setting_reminder_time_default
+        }
+        rows.append(row)
+    return rows
+
+
+@debt_router.post('/debts/bulk', status_code=status.HTTP_201_CREATED)
+async def bulk_create_debts(request: Request, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    """Body: DebtModel massivi (application/json) yoki har qatorda bitta DebtModel (application/x-ndjson).
+
+    Xato qatorlar o'tkazib yuboriladi va "errors" da index bilan qaytariladi, qolganlari bitta tranzaksiyada yoziladi.
+    """
+    if not current_user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not active")
+
+    inserted = 0
+    errors = []
+    batch = []
+    name_ids = {}
+    deltas = {}
+    due_times = []
+    async for index, record in bulk_records(request):
+        try:
+            if isinstance(record, bytes):
+                debt_data = DebtModel.parse_raw(record)
+            else:
+                debt_data = DebtModel.parse_obj(record)
+        except ValidationError as e:
+            errors.append({"index": index, "detail": e.errors()})
+            continue
+        batch.append(debt_data)
+        if len(batch) == BULK_BATCH_SIZE:
+            due_times += await insert_debt_batch(session, current_user, batch, name_ids, deltas)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        due_times += await insert_debt_batch(session, current_user, batch, name_ids, deltas)
+        inserted += len(batch)
+    # butun so'rov uchun bitta balans upsert
+    await apply_balances(session, current_user.id, deltas)
+    if inserted:
+        await bump_data_version(session, current_user.id)
+    await session.commit()
+    if inserted:
+        await aggregate_cache.invalidate(current_user.id)
+    for return_time in due_times:
+        reminder_scheduler.wake(return_time)
+
     response = {
         "success": True,
         "code": 201,
-        "message": "Debt is create successfully",
-        "data": data
+        "message": f"{inserted} debts are created successfully",
+        "data": {
+            "inserted": inserted,
+            "errors": errors
+        }
     }
     return jsonable_encoder(response)
 
 
-@debt_router.get('/debts/{id}/', status_code=status.HTTP_200_OK)
-async def get_debt_by_id(id: int, Authorize: AuthJWT = Depends(), session: Session = Depends(get_db)):
-    try:
-        Authorize.get_raw_jwt()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+@debt_router.get('/debts/export', status_code=status.HTTP_200_OK)
+async def export_debts(format: str = Query("csv"), current_user: CurrentUser = Depends(get_current_user),
+                       session: AsyncSession = Depends(get_db)):
+    """format=(csv, ndjson): foydalanuvchining barcha qarzlari chunk'lab stream qilinadi"""
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid format")
 
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
+    query = (
+        select(*EXPORT_COLUMNS)
+        .join(DebtName, DebtName.id == Debt.name_id)
+        .where(current_user.id == Debt.user_id)
+        .order_by(Debt.id)
+    )
+    return StreamingResponse(
+        stream_export(session, query, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="debts.{format}"'}
+    )
 
-    debt = session.query(Debt).filter(id == Debt.id, current_user.id == Debt.user_id).first()
+
+@debt_router.get('/debts/{id}/', status_code=status.HTTP_200_OK, response_model=DebtResponse)
+async def get_debt_by_id(id: int, request: Request,
+                         current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    if request.headers.get("if-none-match") is not None:
+        # ETag qarzning o'z versiyasi (If-Match bilan bir xil): faqat version ustuni o'qiladi, javob yig'ilmaydi
+        version = await session.scalar(select(Debt.version).where(id == Debt.id, current_user.id == Debt.user_id))
+        if version is not None and is_not_modified(request.headers, debt_etag(version)):
+            return not_modified({"ETag": debt_etag(version)})
+
+    debt = (await session.execute(
+        select(*DEBT_COLUMNS)
+        .join(DebtName, DebtName.id == Debt.name_id)
+        .where(id == Debt.id, current_user.id == Debt.user_id)
+    )).first()
 
     if debt:
-        data = {
-            "id": debt.user.id,
-            "username": debt.user.username,
-            "debt": {
-                "id": debt.id,
-                "debt_type": debt.debt_type.code,
-                "name": debt.debtname.name,
-                "amount": debt.amount,
-                "currency": debt.currency.code,
-                "description": debt.description,
-                "received_or_given_time": debt.received_or_given_time,
-                "return_time": debt.return_time
-            }
-        }
-        response = {
+        response_data = {
             "success": True,
             "code": 200,
             "message": f"Debt with ID {id} get",
-            "data": data
+            "data": {
+                "id": current_user.id,
+                "username": current_user.username,
+                "debt": debt_dict(debt)
+            }
         }
-        return jsonable_encoder(response)
+        return DebtJSONResponse(response_data, headers={"ETag": debt_etag(debt.version)})
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"This debt ID {id} is not found")
 
-@debt_router.delete('/debts/{id}/delete', status_code=status.HTTP_200_OK)
-async def delete_debt_by_id(id: int, Authorize: AuthJWT = Depends(), session: Session = Depends(get_db)):
-    try:
-        Authorize.get_raw_jwt()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
 
-    debt = session.query(Debt).filter(id == Debt.id, current_user.id == Debt.user_id).first()
-    if debt:
-        debt_name_user = debt.debtname.name
-        session.delete(debt)
-        session.commit()
-
-        # DebtName obektini o'chirish
-        debtname = session.query(DebtName).filter(DebtName.name == debt_name_user).first()
-        if debtname:
-            debts_count = session.query(Debt).filter(Debt.name_id == debtname.id).count()
-            if debts_count == 0:
-                session.delete(debtname)
-                session.commit()
+@debt_router.delete('/debts/{id}/delete', status_code=status.HTTP_200_OK)
+async def delete_debt_by_id(id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    # bitta DELETE ... RETURNING; yetim DebtName qatorlarini fon sweep'i tozalaydi
+    deleted = (await session.execute(
+        delete(Debt)
+        .where(id == Debt.id, current_user.id == Debt.user_id)
+        .returning(Debt.name_id, Debt.currency, Debt.debt_type, Debt.amount)
+    )).first()
+    if deleted:
+        await apply_balance(session, current_user.id, *deleted, count=-1)
+        await bump_data_version(session, current_user.id)
+        await session.commit()
+        await aggregate_cache.invalidate(current_user.id)
         data = {
             "success": True,
             "code": 204,
@@ -157,77 +424,132 @@ async def delete_debt_by_id(id: int, Authorize: AuthJWT = Depends(), session: Se
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"This debt ID {id} is not found")
 
 
-@debt_router.put('/debts/{id}/update', status_code=status.HTTP_200_OK)
-async def update_debt_by_id(id: int, update_data: DebtUpdateModel, Authorize: AuthJWT = Depends(), session: Session = Depends(get_db)):
-    try:
-        Authorize.jwt_required()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
-    debt = session.query(Debt).filter(id == Debt.id, current_user.id == Debt.user_id).first()
+UPDATED_DEBT_COLUMNS = (
+    Debt.id, Debt.debt_type, Debt.amount, Debt.currency, Debt.description, Debt.received_or_given_time,
+    Debt.return_time, Debt.setting_reminder_time_default, Debt.version,
+    select(DebtName.name).where(DebtName.id == Debt.name_id).scalar_subquery().label("name"),
+    Debt.name_id
+)
 
-    if debt:
-        debtname = session.query(DebtName).filter(DebtName.name == debt.debtname.name).first()
-        setting = session.query(Setting).filter(current_user.id == Setting.user_id).first()
-        # update debt name
-        if update_data.name is not None:
-            debtname.name = update_data.name
-            debtname_check = session.query(DebtName).filter(debtname.name == DebtName.name).first()
-            if debtname_check is None:
-                new_debtname = DebtName(
-                    name=debtname.name
-                )
-                session.add(new_debtname)
-                session.commit()
-
-        # update return_time
-        if update_data.return_time is not None:
-            debt.return_time = update_data.return_time
-        else:
-            if update_data.setting_reminder_time_default:
-                current_time = datetime.now()
-                delta = timedelta(days=setting.reminder_time)
-                debt.return_time = current_time + delta
 
-        # all update items
-        for key, value in update_data.dict(exclude_unset=True).items():
-            setattr(debt, key, value)
-        session.commit()
+def balance_key(row, prefix=""):
+    """(name_id, currency, debt_type, amount) - balans deltasi uchun"""
+    return (
+        getattr(row, prefix + "name_id"), choice_code(getattr(row, prefix + "currency")),
+        choice_code(getattr(row, prefix + "debt_type")), getattr(row, prefix + "amount")
+    )
 
-        data = {
-            "success": True,
-            "code": 200,
-            "message": f"Debt with ID {id} has been updated",
-            "debt": {
-                "id": debt.id,
-                "debt_type": debt.debt_type.code,
-                "name": debt.debtname.name,
-                "amount": debt.amount,
-                "currency": debt.currency.code,
-                "description": debt.description,
-                "received_or_given_time": debt.received_or_given_time,
-                "return_time": debt.return_time,
-                "setting_reminder_time_default": debt.setting_reminder_time_default
-            }
-        }
-        return jsonable_encoder(data)
-    else:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"This debt ID {id} is not found")
 
+async def update_debt_row(session, debt_id, user_id, values, expected_version):
+    """Qarzni yangilaydi: (yangi qator, eski balans kaliti) yoki qarz topilmasa/versiya mos kelmasa None"""
+    if session.bind.dialect.name != "sqlite":
+        # eski qiymatlar balans deltasi uchun: qator FOR UPDATE bilan qulflanadi, UPDATE bilan bitta so'rovda
+        old = (
+            select(Debt.id, Debt.name_id, Debt.currency, Debt.debt_type, Debt.amount)
+            .where(debt_id == Debt.id, user_id == Debt.user_id)
+            .with_for_update()
+            .cte("old")
+        )
+        # synchronize_session=False: "fetch" strategiyasi cache'langan statement'da RETURNING ustunlarini aralashtirib yuboradi
+        stmt = (
+            update(Debt).where(Debt.id == old.c.id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if expected_version is not None:
+            stmt = stmt.where(Debt.version == expected_version)
+        stmt = stmt.returning(
+            *UPDATED_DEBT_COLUMNS, old.c.name_id.label("old_name_id"), old.c.currency.label("old_currency"),
+            old.c.debt_type.label("old_debt_type"), old.c.amount.label("old_amount")
+        )
+        debt = (await session.execute(stmt)).first()
+        return None if debt is None else (debt, balance_key(debt, "old_"))
+
+    # SQLite'da FOR UPDATE yo'q va RETURNING CTE ustunlarini ko'rmaydi: eski qator avval o'qiladi,
+    # UPDATE esa o'qilgan versiyaga bog'lanadi; oraliqda boshqa yozuv bo'lsa qaytadan o'qiymiz
+    while True:
+        old = (await session.execute(
+            select(Debt.version, Debt.name_id, Debt.currency, Debt.debt_type, Debt.amount)
+            .where(debt_id == Debt.id, user_id == Debt.user_id)
+        )).first()
+        if old is None or (expected_version is not None and old.version != expected_version):
+            return None
+        debt = (await session.execute(
+            update(Debt).where(Debt.id == debt_id, Debt.version == old.version).values(**values)
+            .execution_options(synchronize_session=False)
+            .returning(*UPDATED_DEBT_COLUMNS)
+        )).first()
+        if debt is not None:
+            return debt, balance_key(old)
+
+
+@debt_router.put('/debts/{id}/update', status_code=status.HTTP_200_OK, response_model=DebtUpdateResponse)
+async def update_debt_by_id(id: int, update_data: DebtUpdateModel,
+                            if_match: Optional[str] = Header(None),
+                            current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    """Bitta UPDATE ... RETURNING; If-Match berilsa versiya mos kelmaganda 412"""
+    expected_version = parse_if_match(if_match)
+
+    values = {
+        key: value for key, value in update_data.dict(exclude_unset=True, exclude={"id", "name"}).items()
+        # NOT NULL / balans kalitidagi ustunlarni null bilan o'chirib bo'lmaydi
+        if value is not None or key not in ("amount", "debt_type", "currency")
+    }
+    if "amount" in values:
+        values["amount"] = to_minor(values["amount"])
+    if update_data.return_time is None and update_data.setting_reminder_time_default:
+        values["return_time"] = datetime.now() + timedelta(days=current_user.reminder_time)
+    names = [] if update_data.name is None else [update_data.name]
+    values["version"] = Debt.version + 1
+
+    async def write():
+        if names:
+            # ism cache'da bo'lsa so'rovsiz; qarz shu ismdagi DebtName'ga o'tkaziladi
+            values["name_id"] = (await resolve_debt_name_ids(session, names))[update_data.name]
+        updated = await update_debt_row(session, id, current_user.id, values, expected_version)
+        if updated is None:
+            await session.rollback()
+            exists = await session.scalar(select(Debt.id).where(id == Debt.id, current_user.id == Debt.user_id))
+            if exists is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"This debt ID {id} is not found")
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Debt has been modified")
+
+        debt, old_balance = updated
+        new_balance = balance_key(debt)
+        if new_balance != old_balance:
+            deltas = {}
+            add_balance_delta(deltas, *old_balance, count=-1)
+            add_balance_delta(deltas, *new_balance)
+            await apply_balances(session, current_user.id, deltas)
+        await bump_data_version(session, current_user.id)
+        await session.commit()
+        return debt
+
+    debt = await retry_stale_debt_names(names, write, session.rollback)
+    await aggregate_cache.invalidate(current_user.id)
+    reminder_scheduler.wake(debt.return_time)
+
+    response_data = {
+        "success": True,
+        "code": 200,
+        "message": f"Debt with ID {id} has been updated",
+        "debt": debt_dict(debt)
+    }
+    return DebtJSONResponse(response_data, headers={"ETag": debt_etag(debt.version)})
 
-@debt_router.get("/debts/", status_code=status.HTTP_200_OK)
-async def debt_type_debt_all(debt_type: Optional[str] = Query(None), Authorize: AuthJWT=Depends(), session: Session = Depends(get_db)):
-    """debt_type=(owed_to, owed_by, individual): /api/debts/?debt_type=owed_to """
-    try:
-        Authorize.jwt_required()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
+@debt_router.get("/debts/", status_code=status.HTTP_200_OK,
+                 response_model=Union[DebtPage, List[IndividualDebtSummary]])
+async def debt_type_debt_all(request: Request,
+                             debt_type: Optional[str] = Query(None),
+                             limit: int = Query(DEBT_PAGE_SIZE, ge=1, le=DEBT_PAGE_SIZE_MAX),
+                             after: Optional[int] = Query(None),
+                             stream: bool = Query(False),
+                             current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    """debt_type=(owed_to, owed_by, individual): /api/debts/?debt_type=owed_to
 
+    owed_to/owed_by: {"data": [...], "next_cursor": ...}; keyingi sahifa uchun after=next_cursor.
+    stream=true bo'lsa `after` dan keyingi barcha qarzlar chunk'lab stream qilinadi.
+    """
 
     if debt_type != 'individual':
         if debt_type == "owed_to":
@@ -237,124 +559,139 @@ async def debt_type_debt_all(debt_type: Optional[str] = Query(None), Authorize:
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid debt_type")
 
-        debts = session.query(Debt).filter(current_user.id == Debt.user_id, debt_type_code == Debt.debt_type).all()
-
-        if not debts:
+        # data_version o'zgarmagan bo'lsa qarz jadvaliga tegmasdan 304
+        headers, response = await check_data_version(request, session, current_user.id)
+        if response is not None:
+            return response
+        query = debt_page_query(after, current_user.id == Debt.user_id, debt_type_code == Debt.debt_type)
+        if stream:
+            return StreamingResponse(stream_debt_page(session, query, current_user), media_type="application/json",
+                                     headers=headers)
+
+        rows, next_cursor = await fetch_debt_page(session, query, limit)
+        if not rows and after is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No debts found")
+        return DebtJSONResponse(debt_page_bytes(current_user, rows, next_cursor), headers=headers)
+
+    elif debt_type == 'individual':
+        # debt_balance jadvalidan: faqat foydalanuvchi qarzi bor ismlar bo'yicha OWED_TO/OWED_BY yig'indilari,
+        # har xil valyutalar so'rov ichida foydalanuvchi valyutasiga o'tkaziladi
+        rates = await rates_cache.get()
+        # summalar kurslar jadvaliga va valyutaga ham bog'liq: ikkalasi ham ETag'ga qo'shiladi
+        headers, response, currency = await check_converted_data_version(request, session, current_user.id, rates.version)
+        if response is not None:
+            return response
+        cached = await aggregate_cache.get(current_user.id, "individual", headers["ETag"])
+        if cached is not None:
+            return DebtJSONResponse(cached, headers=headers)
+        rows = (await session.execute(
+            select(
+                DebtName.id,
+                DebtName.name,
+                func.sum(rates.converted(DebtBalance.owed_to, DebtBalance.currency, currency)).label("owed_to_money"),
+                func.sum(rates.converted(DebtBalance.owed_by, DebtBalance.currency, currency)).label("owed_by_money"),
+            )
+            .join(DebtBalance, DebtBalance.name_id == DebtName.id)
+            .where(current_user.id == DebtBalance.user_id, DebtBalance.debt_count > 0)
+            .group_by(DebtName.id, DebtName.name)
+            .order_by(DebtName.id)
+        )).all()
         custom_data = [
             {
-                "user": {
-                    "id": debt.user.id,
-                    "username": debt.user.username
-                },
-                "debt": {
-                    "id": debt.id,
-                    "debt_type": debt.debt_type.code,
-                    "name": debt.debtname.name,
-                    "amount": debt.amount,
-                    "currency": debt.currency.code,
-                    "received_or_given_time": debt.received_or_given_time,
-                    "return_time": debt.return_time,
-                }
-            } for debt in debts
+                "debt_name_id": row.id,
+                "name": row.name,
+                "currency": currency,
+                "owed_to_money": from_minor(row.owed_to_money),
+                "owed_by_money": from_minor(row.owed_by_money),
+                "total": from_minor(row.owed_to_money - row.owed_by_money)
+            } for row in rows
         ]
-        return jsonable_encoder(custom_data)
-
-    elif debt_type == 'individual':
-        debt_names = session.query(DebtName).all()
-        custom_data = []
-        for debt_name in debt_names:
-            owed_to_money = 0
-            owed_by_money = 0
-            debts = session.query(Debt).filter(Debt.name_id == debt_name.id, current_user.id == Debt.user_id).all()
-            for debt in debts:
-                if debt.debt_type == 'OWED_TO':
-                    owed_to_money += debt.amount
-                else:
-                    owed_by_money += debt.amount
-
-            data = {
-                "debt_name_id": debt_name.id,
-                "name": debt_name.name,
-                "owed_to_money": owed_to_money,
-                "owed_by_money": owed_by_money,
-                "total": owed_to_money - owed_by_money
-            }
-            custom_data.append(data)
-        return jsonable_encoder(custom_data)
-
-
-@debt_router.get('/debts/individual/{id}', status_code=status.HTTP_200_OK)
-async def individual_debt_name_by_id(id: int, Authorize: AuthJWT = Depends(), session: Session = Depends(get_db)):
-    try:
-        Authorize.jwt_required()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
-    debtname = session.query(DebtName).filter(id == DebtName.id).first()
+        payload = orjson.dumps(custom_data)
+        await aggregate_cache.set(current_user.id, "individual", headers["ETag"], payload)
+        return DebtJSONResponse(payload, headers=headers)
+
+
+@debt_router.get('/debts/individual/{id}', status_code=status.HTTP_200_OK, response_model=DebtPage)
+async def individual_debt_name_by_id(id: int, request: Request,
+                                     limit: int = Query(DEBT_PAGE_SIZE, ge=1, le=DEBT_PAGE_SIZE_MAX),
+                                     after: Optional[int] = Query(None),
+                                     stream: bool = Query(False),
+                                     current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    headers, response = await check_data_version(request, session, current_user.id)
+    if response is not None:
+        return response
+    cache_key = f"individual/{id}?after={after}&limit={limit}"
+    if not stream:
+        cached = await aggregate_cache.get(current_user.id, cache_key, headers["ETag"])
+        if cached is not None:
+            return DebtJSONResponse(cached, headers=headers)
+    debtname = await session.scalar(select(DebtName).where(id == DebtName.id))
     if not debtname:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"DebtName with Id {id} not found")
 
-    debts = session.query(Debt).filter(current_user.id == Debt.user_id, Debt.name_id == debtname.id).all()
+    query = debt_page_query(after, current_user.id == Debt.user_id, Debt.name_id == debtname.id)
+    if stream:
+        return StreamingResponse(stream_debt_page(session, query, current_user), media_type="application/json",
+                                 headers=headers)
 
-    if debts:
-        custom_data = [
-            {
-                "user": {
-                    "id": debt.user.id,
-                    "username": debt.user.username
-                },
-                "debt": {
-                    "id": debt.id,
-                    "debt_type": debt.debt_type.code,
-                    "name": debt.debtname.name,
-                    "amount": debt.amount,
-                    "currency": debt.currency.code,
-                    "received_or_given_time": debt.received_or_given_time,
-                    "return_time": debt.return_time,
-                }
-            } for debt in debts
-        ]
-        return jsonable_encoder(custom_data)
+    rows, next_cursor = await fetch_debt_page(session, query, limit)
+    if rows or after is not None:
+        payload = debt_page_bytes(current_user, rows, next_cursor)
+        await aggregate_cache.set(current_user.id, cache_key, headers["ETag"], payload)
+        return DebtJSONResponse(payload, headers=headers)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No debts found")
 
 
 @debt_router.get("/monitoring", status_code=status.HTTP_200_OK)
-async def monitoring_debt(Authorize: AuthJWT=Depends(), session: Session = Depends(get_db)):
-    try:
-        Authorize.jwt_required()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
-
-    debts = session.query(Debt).filter(
-        current_user.id == Debt.user_id,
-    ).all()
-    if debts:
-        owed_to_total = 0
-        owed_by_total = 0
-        for debt in debts:
-            if debt.debt_type == "OWED_TO":
-                owed_to_total += debt.amount
-            else:
-                owed_by_total += debt.amount
-
+async def monitoring_debt(request: Request,
+                          current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+    # debt_balance jadvalidan valyuta bo'yicha yig'amiz: UZS va USD bir-biriga qo'shilmaydi;
+    # umumiy summa esa shu so'rovning o'zida (window) foydalanuvchi valyutasiga o'tkazib qo'shiladi
+    rates = await rates_cache.get()
+    headers, response, currency = await check_converted_data_version(request, session, current_user.id, rates.version)
+    if response is not None:
+        return response
+    cached = await aggregate_cache.get(current_user.id, "monitoring", headers["ETag"])
+    if cached is not None:
+        return DebtJSONResponse(cached, headers=headers)
+    owed_to_total = func.sum(DebtBalance.owed_to)
+    owed_by_total = func.sum(DebtBalance.owed_by)
+    rows = (await session.execute(
+        select(
+            DebtBalance.currency,
+            owed_to_total.label("owed_to_total"),
+            owed_by_total.label("owed_by_total"),
+            func.sum(rates.converted(owed_to_total, DebtBalance.currency, currency)).over().label("converted_owed_to"),
+            func.sum(rates.converted(owed_by_total, DebtBalance.currency, currency)).over().label("converted_owed_by"),
+        )
+        .where(current_user.id == DebtBalance.user_id, DebtBalance.debt_count > 0)
+        .group_by(DebtBalance.currency)
+        .order_by(DebtBalance.currency)
+    )).all()
+    if rows:
         data = {
             "user": {
                 "id": current_user.id,
                 "username": current_user.username,
             },
             "debt_monitoring": {
-                "owed_to_total": owed_to_total,
-                "owed_by_total": owed_by_total,
-                "total": owed_to_total - owed_by_total
+                row.currency.code: {
+                    "owed_to_total": from_minor(row.owed_to_total),
+                    "owed_by_total": from_minor(row.owed_by_total),
+                    "total": from_minor(row.owed_to_total - row.owed_by_total)
+                } for row in rows
+            },
+            "total": {
+                "currency": currency,
+                "rates_version": rates.version,
+                "owed_to_total": from_minor(rows[0].converted_owed_to),
+                "owed_by_total": from_minor(rows[0].converted_owed_by),
+                "total": from_minor(rows[0].converted_owed_to - rows[0].converted_owed_by)
             }
         }
-        return jsonable_encoder(data)
+        payload = orjson.dumps(data)
+        await aggregate_cache.set(current_user.id, "monitoring", headers["ETag"], payload)
+        return DebtJSONResponse(payload, headers=headers)
     else:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Debts with not found")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Debts with not found")
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
+
+from app.aggregates import aggregate_cache
+from app.debtnames import debt_name_cache
+from app.dependencies import user_cache
+from app.metrics import registry, Gauge, PROMETHEUS_CONTENT_TYPE
+
+metrics_router = APIRouter()
+
+# cache nomi -> cache_info() beradigan obyekt
+CACHES = {
+    "user": user_cache,
+    "debt_name": debt_name_cache,
+    "aggregate": aggregate_cache,
+}
+
+cache_hits = registry.register(Gauge('cache_hits', 'Cache hits since process start.', ('cache',)))
+cache_misses = registry.register(Gauge('cache_misses', 'Cache misses since process start.', ('cache',)))
+cache_size = registry.register(Gauge('cache_size', 'Entries currently held by an in-process cache.', ('cache',)))
+
+
+def collect_cache_info():
+    for name, cache in CACHES.items():
+        info = cache.cache_info()
+        cache_hits.set(info.hits, name)
+        cache_misses.set(info.misses, name)
+        # redis backend'ning hajmi worker'da ma'lum emas
+        if info.currsize is not None:
+            cache_size.set(info.currsize, name)
+
+
+registry.collectors.append(collect_cache_info)
+
+
+@metrics_router.get('/metrics', status_code=status.HTTP_200_OK, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,12 +1,14 @@
 from fastapi.exceptions import HTTPException
 from fastapi.encoders import jsonable_encoder
-from fastapi import APIRouter, status, Depends
-from fastapi_jwt_auth import AuthJWT
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, status, Depends, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.models import Setting, User
+from app.dependencies import CurrentUser, get_current_user, invalidate_current_user
+from app.models import Setting
 from app.schemas import SettingModel
+from app.versions import bump_data_version, get_data_version, validate_data_version
 
 setting_router = APIRouter(
     prefix='/api/settings'
@@ -14,42 +16,43 @@ setting_router = APIRouter(
 
 
 @setting_router.get('/', status_code=status.HTTP_200_OK)
-async def setting_get(Authorize: AuthJWT = Depends(), session: Session = Depends(get_db)):
-    try:
-        Authorize.jwt_required()
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
-    setting = session.query(Setting).filter(current_user.id == Setting.user_id).first()
+async def setting_get(request: Request, response: Response, current_user: CurrentUser = Depends(get_current_user),
+                      session: AsyncSession = Depends(get_db)):
+    # validator bazadan (primary key so'rovi): CurrentUser cache'i boshqa worker'dagi update'dan 60s gacha eskirgan bo'lishi mumkin
+    data_version = await get_data_version(session, current_user.id)
+    setting_id, currency, reminder_time = current_user.setting_id, current_user.currency, current_user.reminder_time
+    if data_version.version != current_user.data_version:
+        # cache eskirgan: javob bazadagi setting'dan, keyingi so'rovlar uchun cache tozalanadi
+        invalidate_current_user(current_user.username)
+        setting = (await session.execute(
+            select(Setting.id, Setting.currency, Setting.reminder_time).where(current_user.id == Setting.user_id)
+        )).first()
+        setting_id, currency, reminder_time = (None, None, None) if setting is None else (
+            setting.id, setting.currency.code, setting.reminder_time
+        )
+    if setting_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User setting not found")
 
-    if setting:
-        data = {
-            "id": current_user.id,
-            "username": current_user.username,
-            "setting": {
-                "id": setting.id,
-                "currency": setting.currency.code,
-                "reminder_time": setting.reminder_time
-            }
+    headers, not_modified_response = validate_data_version(request, data_version)
+    if not_modified_response is not None:
+        return not_modified_response
+    response.headers.update(headers)
+    data = {
+        "id": current_user.id,
+        "username": current_user.username,
+        "setting": {
+            "id": setting_id,
+            "currency": currency,
+            "reminder_time": reminder_time
         }
-        return jsonable_encoder(data)
-    else:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User setting not found")
+    }
+    return jsonable_encoder(data)
 
 
 @setting_router.put("/", status_code=status.HTTP_200_OK)
-async def update_setting(update_data: SettingModel, Authorize: AuthJWT = Depends(), session: Session = Depends(get_db)):
-    try:
-        Authorize.jwt_required()
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    username = Authorize.get_jwt_subject()
-    current_user = session.query(User).filter(username == User.username).first()
-
-    setting = session.query(Setting).filter(current_user.id == Setting.user_id).first()
+async def update_setting(update_data: SettingModel, current_user: CurrentUser = Depends(get_current_user),
+                         session: AsyncSession = Depends(get_db)):
+    setting = await session.scalar(select(Setting).where(current_user.id == Setting.user_id))
     if setting:
         if update_data.currency is not None:
             setting.currency = update_data.currency
@@ -57,11 +60,14 @@ async def update_setting(update_data: SettingModel, Authorize: AuthJWT = Depends
         if update_data.reminder_time is not None:
             setting.reminder_time = update_data.reminder_time
 
-        session.commit()
+        await bump_data_version(session, current_user.id)
+        await session.commit()
+        await session.refresh(setting)
+        invalidate_current_user(current_user.username)
         data = {
             "success": True,
             "code": 200,
-            "message": f"{username} with setting update",
+            "message": f"{current_user.username} with setting update",
             "setting": {
                 "id": setting.id,
                 "currency": setting.currency.code,
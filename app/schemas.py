@@ -1,7 +1,10 @@
 from datetime import datetime
 
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import Optional, List
+
+from app.models import Debt, Setting
+from app.money import fits_minor
 
 
 class SignUpModel(BaseModel):
@@ -88,6 +91,81 @@ class DebtModel(BaseModel):
             raise ValueError("Invalid datetime format")
         return value
 
+    @validator("debt_type")
+    def validate_debt_type(cls, value):
+        if value is not None and value not in dict(Debt.DEBT_STATUS):
+            raise ValueError(f"debt_type must be one of {', '.join(dict(Debt.DEBT_STATUS))}")
+        return value
+
+    @validator("currency")
+    def validate_currency(cls, value):
+        if value is not None and value not in dict(Setting.CURRENCY_TYPES):
+            raise ValueError(f"currency must be one of {', '.join(dict(Setting.CURRENCY_TYPES))}")
+        return value
+
+    @validator("amount")
+    def validate_amount(cls, value):
+        # bazaga minor birliklarda (BIGINT) yoziladi
+        if value is not None and not fits_minor(value):
+            raise ValueError("amount must be a finite number that fits in the amount column")
+        return value
+
 class DebtUpdateModel(DebtModel):
     name: Optional[str]
-    amount: Optional[float]
\ No newline at end of file
+    amount: Optional[float]
+
+
+# Javob modellari: faqat OpenAPI hujjati uchun, javoblar app.serializers orqali to'g'ridan-to'g'ri bytes'ga yoziladi
+class DebtOut(BaseModel):
+    id: int
+    debt_type: str
+    name: str
+    amount: float
+    currency: str
+    description: Optional[str]
+    received_or_given_time: Optional[datetime]
+    return_time: Optional[datetime]
+    setting_reminder_time_default: Optional[bool]
+
+
+class DebtUserOut(BaseModel):
+    id: int
+    username: str
+
+
+class DebtWithUserOut(DebtUserOut):
+    debt: DebtOut
+
+
+class DebtResponse(BaseModel):
+    success: bool
+    code: int
+    message: str
+    data: DebtWithUserOut
+
+
+class DebtUpdateResponse(BaseModel):
+    success: bool
+    code: int
+    message: str
+    debt: DebtOut
+
+
+class DebtListItem(BaseModel):
+    user: DebtUserOut
+    debt: DebtOut
+
+
+class DebtPage(BaseModel):
+    data: List[DebtListItem]
+    next_cursor: Optional[int]
+
+
+class IndividualDebtSummary(BaseModel):
+    debt_name_id: int
+    name: str
+    # summalar foydalanuvchi sozlamasidagi valyutada
+    currency: str
+    owed_to_money: float
+    owed_by_money: float
+    total: float
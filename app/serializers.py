@@ -0,0 +1,55 @@
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from app.balances import choice_code
+from app.money import from_minor
+from app.models import Debt, DebtName
+
+# qarz javoblari uchun ustunlar: ORM obyekt o'rniga shu tuple'lar so'raladi (DebtName bilan join)
+DEBT_COLUMNS = (
+    Debt.id, Debt.debt_type, DebtName.name, Debt.amount, Debt.currency, Debt.description,
+    Debt.received_or_given_time, Debt.return_time, Debt.setting_reminder_time_default, Debt.version
+)
+
+
+def debt_dict(row, name=None):
+    """DEBT_COLUMNS qatori (yoki Debt obyekti va uning ismi) -> app.schemas.DebtOut shaklidagi dict"""
+    return {
+        "id": row.id,
+        "debt_type": choice_code(row.debt_type),
+        "name": row.name if name is None else name,
+        "amount": from_minor(row.amount),
+        "currency": choice_code(row.currency),
+        "description": row.description,
+        "received_or_given_time": row.received_or_given_time,
+        "return_time": row.return_time,
+        "setting_reminder_time_default": row.setting_reminder_time_default
+    }
+
+
+def debt_list_item(user, row):
+    return {
+        "user": {
+            "id": user.id,
+            "username": user.username
+        },
+        "debt": debt_dict(row)
+    }
+
+
+def debt_page_bytes(user, rows, next_cursor):
+    return orjson.dumps({"data": [debt_list_item(user, row) for row in rows], "next_cursor": next_cursor})
+
+
+def debt_items_chunk(user, rows):
+    """Stream uchun: massiv qavslarisiz, vergul bilan ajratilgan elementlar"""
+    return orjson.dumps([debt_list_item(user, row) for row in rows])[1:-1]
+
+
+class DebtJSONResponse(ORJSONResponse):
+    """Tayyor bytes'ni qayta kodlamaydi, dict/list'ni orjson bilan yozadi (jsonable_encoder'siz)"""
+
+    def render(self, content):
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.aggregates import LocalAggregateCache, RedisAggregateCache
+
+
+class FakeRedis:
+    """redis.asyncio.Redis o'rniga: hash buyruqlari xotirada"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expires = {}
+        self.down = False
+
+    def check(self):
+        if self.down:
+            raise ConnectionError("redis is down")
+
+    async def hget(self, name, key):
+        self.check()
+        return self.hashes.get(name, {}).get(key)
+
+    async def hset(self, name, key, value):
+        self.check()
+        self.hashes.setdefault(name, {})[key] = value
+
+    async def expire(self, name, seconds):
+        self.check()
+        self.expires[name] = seconds
+
+    async def delete(self, name):
+        self.check()
+        self.hashes.pop(name, None)
+
+
+@pytest.mark.parametrize("make_cache", [
+    lambda: LocalAggregateCache(maxsize=10, ttl=60),
+    lambda: RedisAggregateCache(FakeRedis(), ttl=60),
+])
+def test_aggregate_cache_etag_and_invalidate(make_cache):
+    cache = make_cache()
+
+    async def scenario():
+        assert await cache.get(1, "monitoring", '"1-v1"') is None
+        await cache.set(1, "monitoring", '"1-v1"', b'{"total": 1}')
+        await cache.set(1, "individual", '"1-v1"', b'[]')
+        await cache.set(2, "monitoring", '"5-v1"', b'{"total": 2}')
+        assert await cache.get(1, "monitoring", '"1-v1"') == b'{"total": 1}'
+        # boshqa ETag (yangi data_version yoki kurslar) - eskirgan yozuv
+        assert await cache.get(1, "monitoring", '"2-v1"') is None
+
+        # foydalanuvchining barcha kalitlari o'chadi, boshqalarniki qoladi
+        await cache.invalidate(1)
+        assert await cache.get(1, "monitoring", '"1-v1"') is None
+        assert await cache.get(1, "individual", '"1-v1"') is None
+        assert await cache.get(2, "monitoring", '"5-v1"') == b'{"total": 2}'
+
+    asyncio.run(scenario())
+    assert cache.cache_info().hits == 2
+    assert cache.cache_info().misses == 4
+
+
+def test_local_aggregate_cache_bounds_entries_per_user():
+    cache = LocalAggregateCache(maxsize=10, ttl=60, entries_per_user=3)
+
+    async def scenario():
+        # sahifa kalitlari cheksiz ko'p bo'lishi mumkin: eng eski yozilganlari chiqariladi
+        for after in range(5):
+            await cache.set(1, f"individual/7?after={after}&limit=50", '"1"', b'{}')
+        await cache.set(1, "monitoring", '"1"', b'{}')
+        assert list(cache.users.get(1)) == [
+            "individual/7?after=3&limit=50", "individual/7?after=4&limit=50", "monitoring"
+        ]
+        # qayta yozilgan kalit eng yangisi bo'ladi
+        await cache.set(1, "individual/7?after=3&limit=50", '"2"', b'{}')
+        await cache.set(1, "individual", '"2"', b'[]')
+        assert list(cache.users.get(1)) == ["monitoring", "individual/7?after=3&limit=50", "individual"]
+
+    asyncio.run(scenario())
+
+
+def test_redis_aggregate_cache_survives_outage():
+    client = FakeRedis()
+    cache = RedisAggregateCache(client, ttl=60)
+
+    async def scenario():
+        await cache.set(1, "monitoring", '"1"', b'{}')
+        assert client.expires == {"aggregates:1": 60}
+        client.down = True
+        # xato so'rovga chiqmaydi: cache'siz hisoblanadi
+        assert await cache.get(1, "monitoring", '"1"') is None
+        await cache.set(1, "monitoring", '"2"', b'{}')
+        await cache.invalidate(1)
+        client.down = False
+        # invalidatsiya o'tkazib yuborildi, lekin eski ETag'li yozuv yangi ETag bilan qaytmaydi
+        assert await cache.get(1, "monitoring", '"2"') is None
+        assert await cache.get(1, "monitoring", '"1"') == b'{}'
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+from app.metrics import Histogram, Registry
+
+
+def metric_value(text, sample):
+    """`name{labels}` qatoridagi qiymat"""
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = registry.register(Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1)))
+    histogram.observe(0.05, '/a')
+    histogram.observe(0.1, '/a')
+    histogram.observe(5, '/a')
+    text = registry.render()
+
+    assert '# TYPE latency_seconds histogram' in text
+    assert metric_value(text, 'latency_seconds_bucket{route="/a",le="0.1"}') == 2
+    assert metric_value(text, 'latency_seconds_bucket{route="/a",le="1.0"}') == 2
+    assert metric_value(text, 'latency_seconds_bucket{route="/a",le="+Inf"}') == 3
+    assert metric_value(text, 'latency_seconds_count{route="/a"}') == 3
+    assert metric_value(text, 'latency_seconds_sum{route="/a"}') == 5.15
+
+
+def test_metrics_endpoint(client):
+    user = {
+        "username": "Davronbek",
+        "email": "davronbek@gmail.com",
+        "password": "Davronbek",
+        "is_active": True
+    }
+    response = client.post('/auth/signup', json=user)
+    assert response.status_code == 201
+
+    # login user
+    login_user = {
+        "username_or_email": user["username"],
+        "password": user["password"]
+    }
+    response_user = client.post('/auth/login', json=login_user)
+    assert response_user.status_code == 200
+    headers = {
+        "Authorization": f"Bearer {response_user.json()['data']['access']}"
+    }
+    new_debt = {"debt_type": "OWED_TO", "name": "Hasan", "amount": 1000, "currency": "UZS"}
+    response_debt = client.post('api/debts/create', headers=headers, json=new_debt)
+    assert response_debt.status_code == 201
+    debt_id = response_debt.json()["data"]["debt"]["id"]
+
+    before = client.get('/metrics').text
+    route = 'method="GET",route="/api/debts/{id}/"'
+    requests_before = metric_value(before, 'http_requests_total{' + route + ',status="200"}') or 0
+    queries_before = metric_value(before, 'db_queries_per_request_sum{' + route + '}') or 0
+
+    assert client.get(f'api/debts/{debt_id}/', headers=headers).status_code == 200
+    assert client.get(f'api/debts/{debt_id + 1000}/', headers=headers).status_code == 404
+
+    response_metrics = client.get('/metrics')
+    assert response_metrics.status_code == 200
+    assert response_metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response_metrics.text
+
+    # label route shabloni bo'yicha: id'lar alohida seriya hosil qilmaydi
+    assert metric_value(text, 'http_requests_total{' + route + ',status="200"}') == requests_before + 1
+    assert metric_value(text, 'http_requests_total{' + route + ',status="404"}') >= 1
+    assert metric_value(text, 'http_request_duration_seconds_count{' + route + '}') is not None
+    # har so'rovda qarz SELECT'i (testda sessiya SAVEPOINT'lari ham statement sifatida sanaladi)
+    assert metric_value(text, 'db_queries_per_request_sum{' + route + '}') >= queries_before + 2
+    assert metric_value(text, 'db_seconds_per_request_sum{' + route + '}') > 0
+    assert metric_value(text, 'http_requests_in_flight') == 1  # /metrics so'rovining o'zi
+    assert metric_value(text, 'cache_hits{cache="user"}') >= 1
+    assert metric_value(text, 'cache_size{cache="debt_name"}') is not None
@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+import pytest
+
+from app.rates import RatesCache, parse_rates
+
+
+def write_rates(path, rates, version=None):
+    data = {"base": "UZS", "rates": rates}
+    if version is not None:
+        data["version"] = version
+    path.write_text(json.dumps(data))
+
+
+def test_rates_cache_reload_and_version(tmp_path):
+    path = tmp_path / "rates.json"
+    write_rates(path, {"UZS": 1, "USD": 12600, "EUR": 13700}, version="v1")
+    cache = RatesCache(source=str(path), ttl=0)
+
+    table = asyncio.run(cache.get())
+    assert table.version == "v1"
+    assert table.factor("USD", "UZS") == 12600
+    assert table.factor("UZS", "USD") == 1 / 12600
+
+    # versiya berilmasa mazmundan hisoblanadi
+    write_rates(path, {"UZS": 1, "USD": 12700, "EUR": 13700})
+    table = asyncio.run(cache.get())
+    assert table.version != "v1"
+    assert table.rates["USD"] == 12700
+
+    # buzuq fayl: oldingi jadval qoladi
+    path.write_text("{")
+    assert asyncio.run(cache.get()) == table
+
+
+def test_parse_rates_requires_every_currency():
+    with pytest.raises(ValueError):
+        parse_rates(json.dumps({"rates": {"UZS": 1, "USD": 12600}}).encode())
+    with pytest.raises(ValueError):
+        parse_rates(json.dumps({"rates": {"UZS": 1, "USD": 0, "EUR": 13700}}).encode())
@@ -0,0 +1,147 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlalchemy import text, insert, select, delete
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models import ReminderState
+from app.reminders import REMINDER_STATE_ID, ReminderScheduler
+
+
+class CollectingNotifier:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, reminders):
+        self.batches.append(list(reminders))
+
+
+def time_after(seconds):
+    return (datetime.now() + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def serialized(session_factory):
+    """Test sessiyalari bitta ulanishda: scheduler va "boshqa worker" sessiyalari navbat bilan ochiladi"""
+    lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def factory():
+        async with lock:
+            async with session_factory() as session:
+                yield session
+    return factory
+
+
+async def run_scheduler(scheduler, session_factory, seconds, changes=None):
+    task = asyncio.create_task(scheduler.serve(session_factory))
+    while not scheduler.state_created:
+        await asyncio.sleep(0.01)
+    if changes is not None:
+        await changes(scheduler)
+    await asyncio.sleep(seconds)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_reminder_scheduler_fires_due_debts(client, run, session_factory, sql):
+    user = {
+        "username": "Davronbek",
+        "email": "davronbek@gmail.com",
+        "password": "Davronbek",
+        "is_active": True
+    }
+    response = client.post('/auth/signup', json=user)
+    assert response.status_code == 201
+    user_id = response.json()["data"]["id"]
+
+    # login user
+    login_user = {
+        "username_or_email": user["username"],
+        "password": user["password"]
+    }
+    response_user = client.post('/auth/login', json=login_user)
+    assert response_user.status_code == 200
+    headers = {
+        "Authorization": f"Bearer {response_user.json()['data']['access']}"
+    }
+    debts = [
+        {"debt_type": "OWED_TO", "name": "Hasan", "amount": 1000, "currency": "UZS", "return_time": time_after(3)},
+        {"debt_type": "OWED_BY", "name": "Ali", "amount": 300, "currency": "USD", "return_time": time_after(3)},
+        # oynadan tashqarida va muddatsiz qarzlar
+        {"debt_type": "OWED_TO", "name": "Vali", "amount": 500, "currency": "UZS", "return_time": time_after(7200)},
+        {"debt_type": "OWED_TO", "name": "Vali", "amount": 500, "currency": "UZS"},
+    ]
+    debt_ids = []
+    for new_debt in debts:
+        response_debt = client.post('api/debts/create', headers=headers, json=new_debt)
+        assert response_debt.status_code == 201
+        debt_ids.append(response_debt.json()["data"]["debt"]["id"])
+    name_id = sql("SELECT id FROM debtname WHERE name = 'Hasan'").scalar()
+    session_factory = serialized(session_factory)
+
+    async def changes(scheduler):
+        # boshqa worker'dagi yozuvlar (hook'larsiz): Ali'ning qarzi o'chirildi, oyna yuklangandan keyin yangi qarz qo'shildi
+        async with session_factory() as session:
+            await session.execute(text("DELETE FROM debt WHERE id = :id"), {"id": debt_ids[1]})
+            olim_id = (await session.execute(text(
+                "INSERT INTO debt (debt_type, name_id, amount, currency, user_id, return_time) "
+                "VALUES ('OWED_TO', :name_id, 70000, 'EUR', :user_id, :return_time) RETURNING id"
+            ), {"name_id": name_id, "user_id": user_id, "return_time": datetime.now() + timedelta(seconds=1)})).scalar()
+            await session.commit()
+        debt_ids.append(olim_id)
+
+    notifier = CollectingNotifier()
+    scheduler = ReminderScheduler(notifier=notifier, horizon=timedelta(seconds=60), batch_size=1,
+                                  poll_interval=timedelta(seconds=0.5))
+    run(run_scheduler, scheduler, session_factory, 4, changes)
+
+    fired = [reminder for batch in notifier.batches for reminder in batch]
+    assert [reminder.debt_id for reminder in fired] == [debt_ids[4], debt_ids[0]]
+    assert all(len(batch) == 1 for batch in notifier.batches)
+    assert fired[0].amount == 700
+    assert fired[0].currency == "EUR"
+    assert fired[1].name == "Hasan"
+    assert fired[1].currency == "UZS"
+    assert fired[1].amount == 1000
+    assert not scheduler.running
+    assert scheduler.heap == []
+
+    # boshqa worker'ning scheduler'i: yuborilgan oraliq reminder_state'da, eslatmalar takrorlanmaydi
+    other_notifier = CollectingNotifier()
+    other = ReminderScheduler(notifier=other_notifier, horizon=timedelta(seconds=60),
+                              poll_interval=timedelta(seconds=0.5))
+    run(run_scheduler, other, session_factory, 1)
+    assert other_notifier.batches == []
+
+
+def test_reminder_fire_skipped_while_another_worker_holds_the_state(run, async_engine):
+    # alohida ulanishlar (test tranzaksiyasidan tashqarida): ikki worker'ning sessiyalari
+    session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def scenario():
+        notifier = CollectingNotifier()
+        scheduler = ReminderScheduler(notifier=notifier)
+        started = datetime.now() - timedelta(hours=1)
+        async with session_factory() as other_worker:
+            await other_worker.execute(insert(ReminderState).values(id=REMINDER_STATE_ID, fired_until=started))
+            await other_worker.commit()
+            try:
+                # boshqa worker eslatma yuboryapti: bu worker kutmasdan aylanishni o'tkazib yuboradi
+                await other_worker.execute(select(ReminderState).with_for_update())
+                await asyncio.wait_for(scheduler.fire(session_factory, datetime.now()), 5)
+                assert await other_worker.scalar(select(ReminderState.fired_until)) == started
+                await other_worker.rollback()
+
+                now = datetime.now()
+                await scheduler.fire(session_factory, now)
+                assert await other_worker.scalar(select(ReminderState.fired_until)) == now
+            finally:
+                await other_worker.rollback()
+                await other_worker.execute(delete(ReminderState))
+                await other_worker.commit()
+
+    run(scenario)
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple, Optional
+
+from fastapi import Response, status
+from sqlalchemy import select, update, func
+
+from app.models import User, Setting
+
+
+class DataVersion(NamedTuple):
+    version: int
+    modified_at: Optional[datetime]
+    currency: Optional[str] = None
+
+
+async def bump_data_version(session, user_id):
+    """Foydalanuvchi qarzlari yoki sozlamasi o'zgardi: yozuv bilan bitta tranzaksiyada (chaqiruvchi commit qiladi)"""
+    await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1, data_modified_at=func.now())
+    )
+
+
+async def get_data_version(session, user_id):
+    """"user" primary key va setting.user_id (unique) bo'yicha bitta so'rov; qarz jadvallariga tegmaydi.
+
+    Valyuta shu yerdan olinadi: CurrentUser worker cache'ida (60s) boshqa worker'da o'zgargan valyuta eskirgan bo'lishi mumkin.
+    """
+    version, modified_at, currency = (await session.execute(
+        select(User.data_version, User.data_modified_at, Setting.currency)
+        .outerjoin(Setting, Setting.user_id == User.id)
+        .where(User.id == user_id)
+    )).first()
+    return DataVersion(version, modified_at, currency.code if currency is not None else None)
+
+
+def data_etag(version, *parts):
+    """ETag: foydalanuvchi data_version'i va javobga ta'sir qiladigan boshqa versiyalar (masalan, kurslar jadvali)"""
+    return '"' + "-".join(str(part) for part in (version, *parts)) + '"'
+
+
+def http_date(value):
+    # SQLite vaqtni timezone'siz (UTC) qaytaradi
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def validator_headers(etag, modified_at=None):
+    headers = {"ETag": etag}
+    if modified_at is not None:
+        headers["Last-Modified"] = http_date(modified_at)
+    return headers
+
+
+def is_not_modified(request_headers, etag, modified_at=None):
+    """If-None-Match berilgan bo'lsa faqat u tekshiriladi, aks holda If-Modified-Since (soniya aniqligida)"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # GET uchun weak taqqoslash: W/ prefiksi e'tiborga olinmaydi
+        return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is None or modified_at is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if modified_at.tzinfo is None:
+        modified_at = modified_at.replace(tzinfo=timezone.utc)
+    return int(modified_at.timestamp()) <= since.timestamp()
+
+
+def not_modified(headers):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def validate_data_version(request, data_version, *parts):
+    """(validator header'lar, 304 javob yoki None); parts berilsa Last-Modified yuborilmaydi,
+    chunki javob foydalanuvchi yozuvlaridan tashqari narsaga ham bog'liq"""
+    etag = data_etag(data_version.version, *parts)
+    modified_at = None if parts else data_version.modified_at
+    headers = validator_headers(etag, modified_at)
+    if is_not_modified(request.headers, etag, modified_at):
+        return headers, not_modified(headers)
+    return headers, None
+
+
+async def check_data_version(request, session, user_id, *parts):
+    return validate_data_version(request, await get_data_version(session, user_id), *parts)
+
+
+async def check_converted_data_version(request, session, user_id, *parts):
+    """Valyutaga o'tkazilgan yig'indilar uchun: (header'lar, 304 javob yoki None, foydalanuvchi valyutasi);
+    valyuta ham ETag'ga qo'shiladi"""
+    data_version = await get_data_version(session, user_id)
+    headers, response = validate_data_version(request, data_version, *parts, data_version.currency)
+    return headers, response, data_version.currency
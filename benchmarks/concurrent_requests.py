@@ -0,0 +1,80 @@
+"""Concurrent-request throughput: blocking ``Session`` vs ``AsyncSession``.
+
+``before`` is an ``async def`` handler that runs its query through a blocking
+psycopg2 ``Session`` (the old ``get_db``), ``after`` runs the same query through
+the asyncpg ``AsyncSession`` used by the routers. Every query sleeps
+``--latency`` seconds on the server to stand in for a slow Postgres round trip.
+
+Run from the repository root against a local Postgres::
+
+    python -m benchmarks.concurrent_requests --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import SQLALCHEMY_DATABASE_URL
+
+SYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace('+asyncpg', '')
+
+
+def build_app(latency):
+    sync_session = sessionmaker(bind=create_engine(SYNC_DATABASE_URL, pool_size=20))
+    async_session = async_sessionmaker(bind=create_async_engine(SQLALCHEMY_DATABASE_URL, pool_size=20))
+
+    async def get_async_db():
+        async with async_session() as db:
+            yield db
+
+    bench_app = FastAPI()
+
+    @bench_app.get('/before')
+    async def before():
+        with sync_session() as session:
+            session.execute(text('SELECT pg_sleep(:s)'), {'s': latency})
+        return {}
+
+    @bench_app.get('/after')
+    async def after(session: AsyncSession = Depends(get_async_db)):
+        await session.execute(text('SELECT pg_sleep(:s)'), {'s': latency})
+        return {}
+
+    return bench_app
+
+
+async def drive(bench_app, path, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.02, help='server-side query time, seconds')
+    args = parser.parse_args()
+
+    bench_app = build_app(args.latency)
+    for path in ('/before', '/after'):
+        elapsed = await drive(bench_app, path, args.requests, args.concurrency)
+        print(f'{path[1:]:>6}: {args.requests} requests, concurrency {args.concurrency}: '
+              f'{elapsed:.2f}s, {args.requests / elapsed:.1f} req/s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
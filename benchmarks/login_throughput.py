@@ -0,0 +1,94 @@
+"""Login throughput under concurrency: hashing on the event loop vs in the pool.
+
+``before`` verifies the password with werkzeug's ``check_password_hash`` inside
+the ``async def`` handler, the way ``/auth/login`` used to. ``after`` awaits
+``app.passwords.verify_password``, which runs the hash on the bounded thread
+pool. While logins are in flight a ``/ping`` probe measures how long any other
+request on the worker has to wait for the event loop.
+
+No database is needed, only the hash is benchmarked::
+
+    python -m benchmarks.login_throughput --requests 64 --concurrency 16
+    PASSWORD_MAX_WORKERS=8 python -m benchmarks.login_throughput
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from werkzeug.security import check_password_hash
+
+from app.config import password_settings
+from app.passwords import hash_password, verify_password
+
+PASSWORD = 'correct horse battery staple'
+
+
+def build_app(password_hash):
+    bench_app = FastAPI()
+
+    @bench_app.post('/before')
+    async def before():
+        if not check_password_hash(password_hash, PASSWORD):
+            raise HTTPException(status_code=400)
+        return {'ok': True}
+
+    @bench_app.post('/after')
+    async def after():
+        is_valid, _ = await verify_password(password_hash, PASSWORD)
+        if not is_valid:
+            raise HTTPException(status_code=400)
+        return {'ok': True}
+
+    @bench_app.get('/ping')
+    async def ping():
+        return {'ok': True}
+
+    return bench_app
+
+
+async def probe(client, stop, latencies, interval=0.01):
+    # /ping har `interval` soniyada; kechikish = event loop band bo'lgan vaqt + so'rovning o'zi
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        await client.get('/ping')
+        latencies.append(time.perf_counter() - started - interval)
+
+
+async def run(client, path, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            response = await client.post(path)
+            response.raise_for_status()
+
+    stop, latencies = asyncio.Event(), []
+    probe_task = asyncio.create_task(probe(client, stop, latencies))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return elapsed, max(latencies, default=0.0)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    password_hash = await hash_password(PASSWORD)
+    transport = httpx.ASGITransport(app=build_app(password_hash))
+    print(f'method={password_settings.method} max_workers={password_settings.max_workers}')
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for path in ('/before', '/after'):
+            elapsed, worst_ping = await run(client, path, args.requests, args.concurrency)
+            print(f'{path:8} {args.requests / elapsed:7.1f} logins/s   worst /ping {worst_ping * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
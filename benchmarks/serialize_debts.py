@@ -0,0 +1,85 @@
+"""Serialization cost per 1k debts: ``jsonable_encoder`` + ``json`` vs ``app.serializers``.
+
+``before`` rebuilds the old list-endpoint path: a dict per ORM debt, then
+``jsonable_encoder`` twice (the handler, then FastAPI's response
+serialization), then ``JSONResponse``'s ``json.dumps``. ``after`` turns the
+same rows into bytes with ``debt_page_bytes`` (orjson). No database is needed::
+
+    python -m benchmarks.serialize_debts --debts 1000 --repeat 200
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy_utils import Choice
+
+from app.models import Debt, Setting
+from app.serializers import debt_page_bytes
+
+
+def make_rows(count):
+    debt_types = [Choice(code, label) for code, label in Debt.DEBT_STATUS]
+    currencies = [Choice(code, label) for code, label in Setting.CURRENCY_TYPES]
+    now = datetime(2024, 4, 2, 12, 30)
+    return [
+        SimpleNamespace(
+            id=i,
+            debt_type=debt_types[i % 2],
+            name=f'name{i % 100}',
+            amount=100000 + i,
+            currency=currencies[i % 3],
+            description='Bu menda toyga deb olgan edi',
+            received_or_given_time=now - timedelta(days=i),
+            return_time=now + timedelta(days=i),
+            setting_reminder_time_default=False,
+            version=1
+        ) for i in range(count)
+    ]
+
+
+def before(user, rows):
+    # eski debt_list_item + jsonable_encoder (handler) + serialize_response + JSONResponse.render
+    data = {
+        "data": [
+            {
+                "user": {"id": user.id, "username": user.username},
+                "debt": {
+                    "id": row.id,
+                    "debt_type": row.debt_type.code,
+                    "name": row.name,
+                    "amount": row.amount / 100,
+                    "currency": row.currency.code,
+                    "received_or_given_time": row.received_or_given_time,
+                    "return_time": row.return_time,
+                }
+            } for row in rows
+        ],
+        "next_cursor": None
+    }
+    content = jsonable_encoder(jsonable_encoder(data))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def after(user, rows):
+    return debt_page_bytes(user, rows, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--debts', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    user = SimpleNamespace(id=1, username='Davronbek')
+    rows = make_rows(args.debts)
+    for label, serialize in (('before', before), ('after', after)):
+        seconds = min(timeit.repeat(lambda: serialize(user, rows), number=args.repeat, repeat=3)) / args.repeat
+        size = len(serialize(user, rows))
+        print(f'{label:>6}: {seconds * 1000 / args.debts * 1000:8.3f} ms per 1k debts ({size} bytes)')
+
+
+if __name__ == '__main__':
+    main()